@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Time spent converting the date and timestamp fields of a large
+response: strptime for every value (the old way) versus the
+cached fixed-format parsers, one by one and with convert_column.
+
+    python benchmarks/bench_dates.py [count]
+"""
+
+import os
+import sys
+import random
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gsxws import objectify
+
+
+def values(count):
+    rnd = random.Random(1)
+    start = datetime(2014, 1, 1)
+    days = [start + timedelta(days=rnd.randrange(365)) for n in range(count)]
+    dates = [d.strftime('%m/%d/%y') for d in days]
+    stamps = [(d + timedelta(minutes=rnd.randrange(1440))).strftime('%m/%d/%y %I:%M %p')
+              for d in days]
+    return dates, stamps
+
+
+def strptime(dates, stamps):
+    [datetime.strptime(v, '%m/%d/%y').date() for v in dates]
+    [datetime.strptime(v, '%m/%d/%y %I:%M %p') for v in stamps]
+
+
+def fast(dates, stamps):
+    objectify.gsx_date.cache_clear()
+    objectify.gsx_timestamp.cache_clear()
+    [objectify.gsx_date(v) for v in dates]
+    [objectify.gsx_timestamp(v) for v in stamps]
+
+
+def column(dates, stamps):
+    objectify.gsx_date.cache_clear()
+    objectify.gsx_timestamp.cache_clear()
+    objectify.convert_column('repairDate', dates)
+    objectify.convert_column('receivedTimestamp', stamps)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    dates, stamps = values(count)
+
+    for f in (strptime, fast, column):
+        t = min(timeit.repeat(lambda: f(dates, stamps), number=1, repeat=5))
+        print('%-10s %8.1f ms' % (f.__name__, t * 1000))
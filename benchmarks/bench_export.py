@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Building a table out of a large repair lookup: a hand-written loop
+reading every attribute of the GsxElements into lists versus
+export.columns() over the streamed records. Then the number of
+repairs per product since a date, as a Python loop over the
+elements and as a vectorized operation on the columns.
+Needs NumPy.
+
+    python benchmarks/bench_export.py [count]
+"""
+
+import io
+import os
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gsxws import objectify, export
+from bench_records import response
+
+FIELDS = ('repairConfirmationNumber', 'customerName', 'repairStatus', 'repairType',
+          'productName', 'serialNumber', 'repairDate', 'purchaseOrderNumber',
+          'technicianName', 'carrierName', 'isACPlusConsumed')
+
+
+def by_hand(xml):
+    data = dict((f, []) for f in FIELDS)
+    for repair in objectify.parse(xml, 'lookupResponseData'):
+        for f in FIELDS:
+            data[f].append(getattr(repair, f))
+    return data
+
+
+def exported(xml):
+    return export.columns(objectify.iterparse(io.BytesIO(xml), 'lookupResponseData'))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 25000
+    xml = response(count)
+
+    for f in (by_hand, exported):
+        t = min(timeit.repeat(lambda: f(xml), number=1, repeat=3))
+        print('%-9s %8.1f ms' % (f.__name__, t * 1000))
+
+    since = date(2019, 6, 1)
+    repairs = objectify.parse(xml, 'lookupResponseData')
+    cols = exported(xml)
+
+    def loop():
+        counts = {}
+        for r in repairs:
+            if r.repairDate >= since:
+                counts[r.productName] = counts.get(r.productName, 0) + 1
+        return counts
+
+    def vectorized():
+        np = export._numpy()
+        recent = cols['repairDate'] >= np.datetime64(since)
+        products = cols['productName']
+        return dict(zip(products.categories.tolist(),
+                        np.bincount(products.codes[recent], minlength=len(products.categories))))
+
+    assert loop() == vectorized()
+
+    for f in (loop, vectorized):
+        t = min(timeit.repeat(f, number=1, repeat=3))
+        print('%-10s %8.2f ms' % (f.__name__, t * 1000))
+
+
+if __name__ == '__main__':
+    main()
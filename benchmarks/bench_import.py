@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Cold import cost of gsxws: the median wall time of fresh
+interpreters that import it and use a bit of it, minus that
+of an interpreter that does nothing, plus the heavy
+dependencies each case ends up loading.
+
+    python benchmarks/bench_import.py [runs]
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CASES = (
+    ('import gsxws', 'import gsxws'),
+    ('validate()', 'import gsxws; gsxws.validate("DGKFL06JDHJP")'),
+    ('REPAIR_TYPES', 'import gsxws; gsxws.REPAIR_TYPES'),
+    ('Product', 'import gsxws; gsxws.Product'),
+    ('everything', 'from gsxws import *'),
+)
+
+REPORT = '; import sys; print(" ".join(m for m in ("requests", "lxml") if m in sys.modules))'
+
+
+def run(code, runs):
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        out = subprocess.check_output([sys.executable, '-c', code + REPORT], cwd=ROOT)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[runs // 2], out.decode().strip()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    empty, _ = run('pass', runs)
+
+    for name, code in CASES:
+        t, loaded = run(code, runs)
+        print('%-14s %7.1f ms  %s' % (name, (t - empty) * 1000, loaded))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Compares objectify.parse() with the old implementation on response
+bodies from the fixtures. The old one created a new parser per call,
+let lxml.objectify guess the type of every element and searched the
+whole tree for the result. "read" also reads every value in the
+result the way application code does (attribute access).
+
+    python benchmarks/bench_parse.py
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lxml import objectify as lxml_objectify
+from gsxws import objectify
+from gsxws.objectify import (STRING_TYPES, DATETIME_TYPES, DIAGS_TIMESTAMP_TYPES,
+                             BASE64_TYPES, FLOAT_TYPES, gsx_datetime, gsx_diags_timestamp,
+                             gsx_attachment, gsx_price, gsx_date, gsx_timestamp,
+                             gsx_boolean)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures')
+
+CASES = (
+    ('warranty_status.xml', 'warrantyDetailInfo'),
+    ('parts_lookup.xml', 'PartsLookupResponse'),
+    ('repair_details_ca.xml', 'lookupResponseData'),
+)
+
+
+class LegacyElement(lxml_objectify.ObjectifiedElement):
+    def __getattribute__(self, name):
+        try:
+            result = super(LegacyElement, self).__getattribute__(name)
+        except AttributeError:
+            return
+
+        if name in STRING_TYPES:
+            return str(result.text or '')
+
+        if isinstance(result, lxml_objectify.NumberElement):
+            return result.pyval
+
+        if isinstance(result, lxml_objectify.StringElement):
+            name = result.tag
+            result = str(result.text or '')
+
+            if not result:
+                return
+
+            if name in DATETIME_TYPES:
+                return gsx_datetime(result)
+            if name in DIAGS_TIMESTAMP_TYPES:
+                return gsx_diags_timestamp(result)
+            if name in BASE64_TYPES:
+                return gsx_attachment(result)
+            if name in FLOAT_TYPES:
+                return gsx_price(result)
+            if name.endswith('Date'):
+                return gsx_date(result)
+            if name.endswith('Timestamp'):
+                return gsx_timestamp(result)
+            if re.search(r'^[YN]$', result):
+                return gsx_boolean(result)
+
+        return result
+
+
+def legacy_parse(root, response):
+    parser = lxml_objectify.makeparser(remove_blank_text=True)
+    lookup = lxml_objectify.ObjectifyElementClassLookup(tree_class=LegacyElement)
+    parser.set_element_class_lookup(lookup)
+
+    if isinstance(root, str) and os.path.exists(root):
+        root = lxml_objectify.parse(root, parser)
+    else:
+        root = lxml_objectify.fromstring(root, parser)
+
+    return root.find('*//%s' % response)
+
+
+def read(el):
+    for child in el.iterchildren():
+        value = getattr(el, child.tag)
+        if isinstance(value, lxml_objectify.ObjectifiedElement):
+            read(value)
+
+
+def main():
+    n = 1000
+    print('%-24s %12s %12s %12s %12s' % ('fixture (us)', 'old parse', 'new parse',
+                                          'old read', 'new read'))
+    for name, response in CASES:
+        with open(os.path.join(FIXTURES, name), 'rb') as fp:
+            data = fp.read()
+
+        row = []
+        for parse in (legacy_parse, objectify.parse):
+            row.append(min(timeit.repeat(lambda: parse(data, response),
+                                         number=n, repeat=3)))
+        for parse in (legacy_parse, objectify.parse):
+            result = parse(data, response)
+            row.append(min(timeit.repeat(lambda: read(result), number=n, repeat=3)))
+
+        print('%-24s %12.1f %12.1f %12.1f %12.1f' % ((name,) + tuple(t / n * 1e6 for t in row)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+How much a large repair lookup stalls the other threads of the
+process when it's parsed and materialized inline versus in a
+process pool (GSX_PARSE_POOL). A ticker thread stands in for
+the network I/O a worker would be doing meanwhile; it should
+tick every millisecond.
+
+    python benchmarks/bench_pool.py [count]
+"""
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gsxws import objectify
+from bench_records import response
+
+
+class Ticker(threading.Thread):
+    def __init__(self):
+        super(Ticker, self).__init__(daemon=True)
+        self.ticks, self.worst, self.running = 0, 0, True
+
+    def run(self):
+        last = time.perf_counter()
+        while self.running:
+            time.sleep(0.001)
+            now = time.perf_counter()
+            self.ticks += 1
+            self.worst = max(self.worst, now - last)
+            last = now
+
+
+def measure(name, parse):
+    ticker = Ticker()
+    ticker.start()
+    start = time.perf_counter()
+    records = parse()
+    total = time.perf_counter() - start
+    ticker.running = False
+    ticker.join()
+    print('%-7s %7.1f ms  %5d ticks  worst gap %6.1f ms  (%d records)' % (
+          name, total * 1000, ticker.ticks, ticker.worst * 1000, len(records)))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 25000
+    xml = response(count)
+
+    with ProcessPoolExecutor(1) as pool:
+        pool.submit(len, b'').result()  # start the worker up front
+
+        measure('inline', lambda: objectify.parse_records(xml, 'lookupResponseData'))
+        measure('pool', lambda: pool.submit(objectify.parse_records, xml,
+                                            'lookupResponseData').result())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+A device picker asking for the models matching what has been
+typed so far: parsing products.yaml on every keystroke (the way
+models() used to work) versus the prebuilt product index.
+
+    python benchmarks/bench_products.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import yaml
+from gsxws import products
+
+TYPED = 'macbook pro (retina'
+PATH = os.path.join(os.path.dirname(products.__file__), 'products.yaml')
+
+
+def parse_yaml():
+    with open(PATH, 'r') as fp:
+        families = yaml.safe_load(fp)
+    prefix = TYPED.lower()
+    return sorted(m for f in families.values() for m in f['models']
+                  if m.lower().startswith(prefix))
+
+
+def prefix():
+    return products.index().startswith(TYPED)
+
+
+def substring():
+    return products.index().search(TYPED)
+
+
+def as_dict():
+    return products.models()
+
+
+if __name__ == '__main__':
+    assert parse_yaml() == sorted(prefix())
+
+    for f in (parse_yaml, prefix, substring, as_dict):
+        n, t = timeit.Timer(f).autorange()
+        print('%-10s %10.1f us' % (f.__name__, t / n * 1e6))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Memory held by the results of ten 2500 repair lookups as live
+GsxElement trees versus materialized GsxRecords, and the size of
+one lookup as pickled records. Each case runs in a fresh process
+and reports its RSS growth (Linux).
+
+    python benchmarks/bench_records.py [count] [lookups]
+"""
+
+import os
+import sys
+import pickle
+import random
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gsxws import objectify
+
+REPAIR = """<lookupResponseData>
+<repairConfirmationNumber>G%(n)09d</repairConfirmationNumber>
+<customerName>Lepalaan,Filipp</customerName>
+<repairStatus>%(status)s</repairStatus>
+<repairType>CA</repairType>
+<productName>%(product)s</productName>
+<serialNumber>C02%(n)09d</serialNumber>
+<repairDate>%(date)s</repairDate>
+<purchaseOrderNumber>PO%(n)d</purchaseOrderNumber>
+<technicianName>Technician %(tech)d</technicianName>
+<carrierName>%(carrier)s</carrierName>
+<isACPlusConsumed>N</isACPlusConsumed>
+</lookupResponseData>"""
+
+
+def response(count):
+    rnd = random.Random(1)
+    repairs = ''.join(REPAIR % {
+        'n': n,
+        'status': rnd.choice(['Closed and Completed', 'Ready for Pickup', 'Open']),
+        'product': rnd.choice(['MacBook Pro (15-inch, 2017)', 'iMac (Retina 5K, 27-inch, 2019)',
+                               'iPhone 8', 'iPad Pro (10.5-inch)']),
+        'date': '%02d/%02d/19' % (rnd.randint(1, 12), rnd.randint(1, 28)),
+        'tech': rnd.randint(1, 10),
+        'carrier': rnd.choice(['UPS', 'DHL', 'TNT']),
+    } for n in range(count))
+
+    return ('<S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/"><S:Body>'
+            '<ns4:RepairLookupResponse xmlns:ns4="http://gsxws.apple.com/elements/core/asp">'
+            '<RepairLookupResponse>%s</RepairLookupResponse>'
+            '</ns4:RepairLookupResponse></S:Body></S:Envelope>' % repairs).encode()
+
+
+def rss():
+    with open('/proc/self/statm') as fp:
+        return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def measure(xml, lookups, materialize, queue):
+    before = rss()
+    results = []
+    for i in range(lookups):
+        result = objectify.parse(xml, 'lookupResponseData')
+        if materialize:
+            result = objectify.materialize(result)
+        else:
+            # Keep the repairs around the way a caller holding them would
+            result = list(result)
+        results.append(result)
+    queue.put(rss() - before)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2500
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    xml = response(count)
+    ctx = multiprocessing.get_context('fork')
+
+    for name, materialize in (('GsxElement tree', False), ('GsxRecords', True)):
+        queue = ctx.Queue()
+        p = ctx.Process(target=measure, args=(xml, lookups, materialize, queue))
+        p.start()
+        print('%-16s %8d kB' % (name, queue.get() // 1024))
+        p.join()
+
+    records = objectify.materialize(objectify.parse(xml, 'lookupResponseData'))
+    print('%-16s %8d kB pickled' % ('GsxRecords', len(pickle.dumps(records)) // 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Compares GsxObject.to_bytes() with serializing the element tree
+built by GsxObject.to_xml() for the request payloads in tests/fixtures.
+
+    python benchmarks/bench_serializer.py
+"""
+
+import os
+import sys
+import glob
+import json
+import timeit
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tests.test_gsxws import make_object
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures')
+
+
+def payloads():
+    for path in sorted(glob.glob(os.path.join(FIXTURES, '*.json'))):
+        with open(path) as fp:
+            yield os.path.basename(path), make_object(json.load(fp))
+
+    # A stocking order with lots of lines
+    lines = [{'partNumber': '661-%04d' % i, 'quantity': '1'} for i in range(2000)]
+    yield 'stocking_order_2000_lines', make_object({'purchaseOrderNumber': '123',
+                                                    'orderLines': lines})
+
+
+def main(number=200):
+    print('%-36s %10s %10s %6s' % ('payload', 'tree (ms)', 'bytes (ms)', 'x'))
+
+    for name, obj in payloads():
+        tree = etree.tostring(obj.to_xml('requestData'), encoding='UTF-8')
+        assert obj.to_bytes('requestData') == tree, name
+
+        n = number if len(tree) < 10000 else max(number // 50, 1)
+        t1 = timeit.timeit(lambda: etree.tostring(obj.to_xml('requestData'), encoding='UTF-8'), number=n)
+        t2 = timeit.timeit(lambda: obj.to_bytes('requestData'), number=n)
+        print('%-36s %10.3f %10.3f %6.1f' % (name, t1 * 1000 / n, t2 * 1000 / n, t1 / t2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Peak memory and time to the first result when going through
+a large repair lookup one repair at a time: parsing the whole
+response first (as is or materialized) versus streaming it
+with objectify.iterparse. Each case runs in a fresh process
+(Linux).
+
+    python benchmarks/bench_stream.py [count]
+"""
+
+import io
+import os
+import sys
+import time
+import resource
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gsxws import objectify
+from bench_records import response
+
+
+def peak():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def tree(xml):
+    return iter(objectify.parse(xml, 'lookupResponseData'))
+
+
+def records(xml):
+    return iter(objectify.materialize(objectify.parse(xml, 'lookupResponseData')))
+
+
+def stream(xml):
+    return objectify.iterparse(io.BytesIO(xml), 'lookupResponseData')
+
+
+def measure(xml, f, queue):
+    before = peak()
+    start = time.perf_counter()
+    first = None
+    for r in f(xml):
+        if first is None:
+            first = time.perf_counter() - start
+        r.repairConfirmationNumber, r.repairDate, r.productName
+    queue.put((peak() - before, first, time.perf_counter() - start))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 25000
+    xml = response(count)
+    ctx = multiprocessing.get_context('fork')
+
+    for f in (tree, records, stream):
+        queue = ctx.Queue()
+        p = ctx.Process(target=measure, args=(xml, f, queue))
+        p.start()
+        growth, first, total = queue.get()
+        print('%-7s peak +%7d kB  first %7.1f ms  total %7.1f ms' % (
+              f.__name__, growth, first * 1000, total * 1000))
+        p.join()
+
+
+if __name__ == '__main__':
+    main()
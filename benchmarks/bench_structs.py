@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Compares building and serializing a carry-in repair with lots of
+order lines as GsxStruct objects and as plain GsxObjects.
+
+    python benchmarks/bench_structs.py
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gsxws.core import GsxObject
+from gsxws.repairs import CarryInRepair, Customer, RepairOrderLine
+
+LINES = 2000
+
+
+def repair(line, customer):
+    rep = CarryInRepair(shipTo='6191', serialNumber='DGKFL06JDHJP')
+    rep.customerAddress = customer(firstName='Filipp', lastName='Lepalaan',
+                                   city='Helsinki', zipCode=85024)
+    rep.orderLines = [line(partNumber='661-%04d' % i, comptiaCode='X01',
+                           comptiaModifier='D', abused=False,
+                           outOfWarrantyFlag=False) for i in range(LINES)]
+    return rep
+
+
+def memory(line, customer):
+    tracemalloc.start()
+    rep = repair(line, customer)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return rep, size
+
+
+if __name__ == '__main__':
+    for name, line, customer in (('GsxObject', GsxObject, GsxObject),
+                                 ('GsxStruct', RepairOrderLine, Customer)):
+        build = min(timeit.repeat(lambda: repair(line, customer), number=10, repeat=3))
+        rep, size = memory(line, customer)
+        dump = min(timeit.repeat(lambda: rep.to_bytes('repairData'), number=10, repeat=3))
+        print('%-10s build %.2f ms  serialize %.2f ms  memory %d kB' % (
+            name, build * 100, dump * 100, size // 1024))
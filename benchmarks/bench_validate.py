@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Classifies a million mixed identifiers with the old validate()
+(nine separate regexes), the compiled validate() and classify().
+
+    python benchmarks/bench_validate.py [count]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gsxws.core import validate, classify
+
+
+def legacy_validate(value, what=None):
+    result = None
+    rex = {
+        'partNumber':       r'^([A-Z]{1,4})?\d{1,3}\-?(\d{1,5}|[A-Z]{1,2})(/[A-Z])?$',
+        'serialNumber':     r'^[A-Z0-9]{11,12}$',
+        'eeeCode':          r'^[A-Z0-9]{3,4}$',
+        'returnOrder':      r'^7\d{9}$',
+        'repairNumber':     r'^\d{12}$',
+        'dispatchId':       r'^[A-Z]+\d{9,15}$',
+        'alternateDeviceId': r'^\d{15}$',
+        'diagnosticEventNumber': r'^\d{23}$',
+        'productName':      r'^i?Mac',
+    }
+
+    for k, v in list(rex.items()):
+        if re.match(v, value):
+            result = k
+
+    return (result == what) if what else result
+
+
+def identifiers(count):
+    rnd = random.Random(1)
+    chars = 'ABCDEFGHJKLMNPQRSTUVWXYZ0123456789'
+    makers = (
+        lambda: ''.join(rnd.choice(chars) for _ in range(12)),           # serial
+        lambda: '%015d' % rnd.randrange(10 ** 15),                       # IMEI
+        lambda: '661-%05d' % rnd.randrange(10 ** 5),                     # part
+        lambda: 'G%09d' % rnd.randrange(10 ** 9),                        # dispatch
+        lambda: '7%09d' % rnd.randrange(10 ** 9),                        # return order
+        lambda: 'MacBook Pro (Retina, Mid 2012)',                        # product
+        lambda: 'not an identifier',
+    )
+    return [rnd.choice(makers)() for _ in range(count)]
+
+
+def bench(name, func):
+    start = time.perf_counter()
+    result = func()
+    print('%-20s %8.3f s' % (name, time.perf_counter() - start))
+    return result
+
+
+def main(count=1000000):
+    values = identifiers(count)
+    print('%d identifiers' % count)
+
+    old = bench('legacy validate()', lambda: [legacy_validate(v) for v in values])
+    new = bench('validate()', lambda: [validate(v) for v in values])
+    bulk = bench('classify()', lambda: classify(values))
+
+    assert old == new == [r for v, r in bulk]
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
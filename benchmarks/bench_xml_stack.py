@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Times what a GSX call costs in XML handling around the network round
+trip: serializing the session into the envelope and turning the
+response into something usable. The legacy column converts between
+ElementTree and lxml like the old code did, the current column uses
+lxml throughout.
+
+    python benchmarks/bench_xml_stack.py
+"""
+
+import os
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lxml import etree
+from gsxws import core
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as fp:
+        return fp.read()
+
+
+def legacy_session():
+    session = ET.Element('userSession')
+    ET.SubElement(session, 'userSessionId').text = 'abc'
+    return session
+
+
+def current_session():
+    session = etree.Element('userSession')
+    etree.SubElement(session, 'userSessionId').text = 'abc'
+    return session
+
+
+def legacy_fault(xml):
+    # GsxError used to dig the fault out of the body with ElementTree
+    root = ET.fromstring(xml)
+    messages = []
+    for path in ('*//faultcode', '*//faultstring', '*//code', '*//message'):
+        messages += [el.text for el in root.findall(path)]
+    return messages
+
+
+def current_fault(xml):
+    return core.GsxError(xml=xml).messages
+
+
+def main():
+    ls, cs = legacy_session(), current_session()
+    lookup = fixture('repair_details_ca.xml')
+    fault = fixture('multierror.xml')
+
+    cases = (
+        ('session', lambda: ET.tostring(ls, 'UTF-8'), lambda: etree.tostring(cs)),
+        ('raw response', lambda: ET.fromstring(lookup), lambda: etree.fromstring(lookup)),
+        ('fault', lambda: legacy_fault(fault), lambda: current_fault(fault)),
+    )
+
+    n = 2000
+    print('%-22s %12s %12s' % ('per call', 'legacy (us)', 'current (us)'))
+    for name, legacy, current in cases:
+        t0 = min(timeit.repeat(legacy, number=n, repeat=3)) / n * 1e6
+        t1 = min(timeit.repeat(current, number=n, repeat=3)) / n * 1e6
+        print('%-22s %12.1f %12.1f' % (name, t0, t1))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,70 @@
 # -*- coding: utf-8 -*-
+"""
+The submodules, and the names they make available directly from
+gsxws, are only imported when first used, so a bare import gsxws
+costs next to nothing.
+"""
+
+from importlib import import_module as _import
 
 name = 'gsxws'
 
-from .core import *
-from .repairs import *
-from .products import *
-from .returns import *
-from .comms import *
-from .diagnostics import *
-from .parts import *
-from .comptia import *
-from .escalations import *
-from .lookups import *
-from .orders import *
-from . import objectify
+_SUBMODULES = ('core', 'repairs', 'products', 'returns', 'comms', 'diagnostics',
+               'parts', 'comptia', 'escalations', 'lookups', 'orders',
+               'objectify', 'methods', 'snapshot', 'export', 'utils', 'content',)
+
+# The public names of gsxws and the submodules that define them
+_NAMES = {
+    'core': (
+        'VERSION', 'GSX_ENV', 'GSX_LANG', 'GSX_REGION', 'GSX_LOCALE', 'GSX_TIMEOUT',
+        'GSX_SESSION', 'GSX_SPOOL_SIZE', 'GSX_CHUNK_SIZE', 'GSX_KEEP_RESPONSE',
+        'GSX_PARSE_POOL', 'GSX_POOL_SIZE', 'GSX_PREFLIGHT', 'GSX_REGIONS',
+        'GSX_TIMEZONE', 'GSX_TIMEZONES', 'REGION_CODES', 'ENVIRONMENTS', 'GSX_HOSTS',
+        'GSX_URL', 'IDENTIFIERS', 'FAULT_CODES', 'FAULT_MESSAGES', 'FIELD_FORMATS',
+        'FIELD_CONVERTERS', 'validate', 'classify', 'xml_escape', 'get_format',
+        'preflight', 'connect', 'GsxError', 'GsxValidationError', 'GsxConnectionError',
+        'GsxCache', 'GsxRequest', 'GsxResponse', 'GsxFile', 'GsxBase', 'GsxObject',
+        'GsxSchema', 'GsxStruct', 'GsxRequestObject', 'GsxSession',
+    ),
+    'repairs': (
+        'REPAIR_TYPES', 'REPAIR_STATUSES', 'COVERAGE_STATUSES', 'SymptomIssue',
+        'CompTiaCode', 'Customer', 'RepairOrderLine', 'ComponentCheck', 'ServicePart',
+        'Repair', 'CannotDuplicateRepair', 'CarryInRepair', 'IndirectOnsiteRepair',
+        'RepairOrReplace', 'WholeUnitExchange', 'MailInRepair', 'DepotShipperLabel',
+    ),
+    'products': ('ProductIndex', 'index', 'models', 'Product',),
+    'returns': ('RETURN_TYPES', 'CARRIERS', 'Return',),
+    'comms': ('Communication', 'content', 'ack',),
+    'diagnostics': ('Diagnostics',),
+    'parts': ('REASON_CODES', 'IMAGE_URL', 'Part',),
+    'comptia': ('fetch', 'MODIFIERS', 'GROUPS', 'CompTIA',),
+    'escalations': (
+        'STATUS_OPEN', 'STATUS_CLOSED', 'STATUS_ESCALATED', 'STATUSES', 'CONTEXTS',
+        'ISSUE_TYPES', 'FileAttachment', 'Escalation', 'Context',
+    ),
+    'lookups': ('Lookup',),
+    'orders': ('OrderLine', 'APPOrder', 'StockingOrder',),
+    'objectify': ('GsxRecord',),
+    'utils': ('fetch_url',),
+}
+
+_modules = dict((n, m) for m, names in _NAMES.items() for n in names)
+
+__all__ = list(_modules) + ['objectify']
+
+
+def __getattr__(attr):
+    try:
+        module = _modules[attr]
+    except KeyError:
+        if attr in _SUBMODULES:
+            return _import('.' + attr, __name__)
+        raise AttributeError("module 'gsxws' has no attribute '%s'" % attr)
+
+    value = getattr(_import('.' + module, __name__), attr)
+    globals()[attr] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_modules) | set(_SUBMODULES))
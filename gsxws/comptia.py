@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import logging
+from . import snapshot
 from .core import GsxObject, GsxCache
 
 MODIFIERS = (
@@ -63,6 +64,11 @@ class CompTIA(GsxObject):
         if self._cache.get('comptia'):
             return self._cache.get('comptia')
 
+        snap = snapshot.load()
+        if snap is not None and snap.keys('comptia'):
+            self._comptia = snap.comptia()
+            return self._comptia
+
         doc = self._submit("ComptiaCodeLookupRequest", "ComptiaCodeLookup",
                            "comptiaInfo", raw=True)
         root = doc.find('.//comptiaInfo')
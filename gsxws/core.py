@@ -26,17 +26,19 @@ OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMA
 
 import os
 import re
+import glob
 import json
 import base64
 import shelve
 import os.path
 import hashlib
 import logging
-import requests
 import tempfile
-import xml.etree.ElementTree as ET
 
-from . import objectify
+# requests and lxml are imported where they're needed, so that
+# importing this module (for validate() and the like) stays cheap
+from . import methods
+from . import snapshot
 from datetime import date, time, datetime, timedelta
 
 VERSION     = "0.94"
@@ -49,6 +51,23 @@ GSX_TIMEOUT = 30 # session timeout (expiration) in minutes
 
 GSX_SESSION = None
 
+# Request and response bodies larger than this are spooled to disk
+# and streamed from there
+GSX_SPOOL_SIZE = 1024 * 1024
+GSX_CHUNK_SIZE = 64 * 1024
+
+# Keep the raw body of the last response in GsxRequest.xml_response
+GSX_KEEP_RESPONSE = False
+
+# An executor (such as a concurrent.futures.ProcessPoolExecutor) that parses
+# and materializes responses of at least GSX_POOL_SIZE bytes out of this
+# thread. Only used for requests submitted with materialize=True.
+GSX_PARSE_POOL = None
+GSX_POOL_SIZE = 4 * 1024 * 1024
+
+# Check payloads locally before sending them (see preflight())
+GSX_PREFLIGHT = False
+
 GSX_REGIONS = (
     ('002', "Asia/Pacific"),
     ('003', "Japan"),
@@ -101,6 +120,24 @@ GSX_HOSTS = {'pr': '', 'it': 'it', 'ut': 'ut'}
 GSX_URL = os.getenv('GSX_URL', "https://gsxapi{env}.apple.com/gsx-ws/services/{region}/asp")
 
 
+# In order of increasing precedence: if a value looks like more
+# than one of these, the last one wins.
+IDENTIFIERS = (
+    ('partNumber',          r'(?:[A-Z]{1,4})?\d{1,3}\-?(?:\d{1,5}|[A-Z]{1,2})(?:/[A-Z])?$'),
+    ('serialNumber',        r'[A-Z0-9]{11,12}$'),
+    ('eeeCode',             r'[A-Z0-9]{3,4}$'),
+    ('returnOrder',         r'7\d{9}$'),
+    ('repairNumber',        r'\d{12}$'),
+    ('dispatchId',          r'[A-Z]+\d{9,15}$'),
+    ('alternateDeviceId',   r'\d{15}$'),
+    ('diagnosticEventNumber', r'\d{23}$'),
+    ('productName',         r'i?Mac'),
+)
+
+# All the identifiers in one pattern, tried in order of precedence
+_classify = re.compile('|'.join('(?P<%s>%s)' % i for i in reversed(IDENTIFIERS))).match
+
+
 def validate(value, what=None):
     """
     Tries to guess the meaning of value or validate that
@@ -125,38 +162,149 @@ def validate(value, what=None):
     >>> validate('MacBook Pro (Retina, Mid 2012)', 'productName')
     True
     """
-    result = None
-
     if not isinstance(value, str):
         raise ValueError('%s is not valid input (%s != string)' % (value, type(value)))
 
-    rex = {
-        'partNumber':       r'^([A-Z]{1,4})?\d{1,3}\-?(\d{1,5}|[A-Z]{1,2})(/[A-Z])?$',
-        'serialNumber':     r'^[A-Z0-9]{11,12}$',
-        'eeeCode':          r'^[A-Z0-9]{3,4}$',
-        'returnOrder':      r'^7\d{9}$',
-        'repairNumber':     r'^\d{12}$',
-        'dispatchId':       r'^[A-Z]+\d{9,15}$',
-        'alternateDeviceId': r'^\d{15}$',
-        'diagnosticEventNumber': r'^\d{23}$',
-        'productName':      r'^i?Mac',
-    }
-
-    for k, v in list(rex.items()):
-        if re.match(v, value):
-            result = k
+    m = _classify(value)
+    result = m.lastgroup if m else None
 
     return (result == what) if what else result
 
 
+def classify(values, what=None):
+    """
+    Validates a whole list (or any iterable) of identifiers at once.
+    Values are normalized first: they're converted to strings,
+    stripped of surrounding whitespace and uppercased if that's what
+    it takes for them to be recognized.
+
+    Returns a list of (value, result) tuples where value is
+    the normalized value and result is what validate() would return.
+
+    >>> classify([' c02abc123def ', 'G143111400', 'n/a'])
+    [('C02ABC123DEF', 'serialNumber'), ('G143111400', 'dispatchId'), ('n/a', None)]
+    >>> classify(['661-5097', 'n/a'], 'partNumber')
+    [('661-5097', True), ('n/a', False)]
+    """
+    match = _classify
+    results = []
+    append = results.append
+
+    for value in values:
+        if not isinstance(value, str):
+            value = str(value)
+
+        value = value.strip()
+        m = match(value)
+
+        if m is None:
+            upper = value.upper()
+            if upper != value:
+                m = match(upper)
+                if m is not None:
+                    value = upper
+
+        result = m.lastgroup if m else None
+        append((value, (result == what) if what else result))
+
+    return results
+
+
+def xml_escape(text):
+    """Escapes text for XML character data the same way lxml does."""
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    if '\r' in text:
+        text = text.replace('\r', '&#13;')
+    return text
+
+
+_locale_formats = None
+
+
+def _date_format(df):
+    """
+    Converts a GSX date format (DD/MM/YY) to a strftime pattern.
+
+    >>> _date_format('YYYY/MM/DD')
+    '%Y/%m/%d'
+    """
+    if '%' in df:
+        return df
+
+    for k, v in (('YYYY', '%Y'), ('YY', '%y'), ('MM', '%m'), ('DD', '%d')):
+        df = df.replace(k, v)
+
+    return df
+
+
+def _time_format(tf):
+    """
+    Converts a GSX time format (HH:MM A) to a strftime pattern.
+
+    >>> _time_format('HH:MM A')
+    '%I:%M %p'
+    >>> _time_format('HH:MM')
+    '%H:%M'
+    """
+    if '%' in tf:
+        return tf
+
+    if tf.endswith(' A'):
+        return tf[:-2].replace('HH', '%I').replace('MM', '%M') + ' %p'
+
+    return tf.replace('HH', '%H').replace('MM', '%M')
+
+
+def _load_formats():
+    snap = snapshot.load()
+
+    if snap is not None:
+        langs = dict((k, snap.locale(k)) for k in snap.keys('langs'))
+    else:
+        filepath = os.path.join(os.path.dirname(__file__), 'langs.json')
+        with open(filepath, 'r') as df:
+            langs = json.load(df)
+
+    return dict((k, {'df': _date_format(v['df']), 'tf': _time_format(v['tf'])})
+                for k, v in langs.items())
+
+
 def get_format(locale=GSX_LOCALE):
-    filepath = os.path.join(os.path.dirname(__file__), 'langs.json')
-    with open(filepath, 'r') as df:
-        return json.load(df).get(locale)
+    """
+    Returns the strftime date (df) and time (tf) patterns of locale.
+    The formats are loaded only once, so don't modify the result.
+
+    >>> get_format('de_XXX')
+    {'df': '%d.%m.%y', 'tf': '%H:%M'}
+    """
+    global _locale_formats
+
+    if _locale_formats is None:
+        _locale_formats = _load_formats()
+
+    return _locale_formats.get(locale)
+
+
+# Elements that describe what went wrong in a GSX fault
+FAULT_CODES = ('faultcode', 'code',)
+FAULT_MESSAGES = ('faultstring', 'message',)
+
+# An XML body starts with a tag or the XML declaration,
+# anything else (including HTML error pages) is not worth parsing
+_is_xml_body = re.compile(br'\s*<(?!!doctype html|html)', re.I).match
 
 
 class GsxError(Exception):
-    """A generic GSX-related error."""
+    """
+    A generic GSX-related error.
+    xml is the body of the error response (bytes or str) or the
+    already parsed tree of it.
+    """
 
     def __init__(self, message=None, xml=None, url=None, code=None, status=None):
         """Initialize a GsxError."""
@@ -169,24 +317,39 @@ class GsxError(Exception):
         if status == 403:
             self.messages.append('Access denied')
 
-        if xml is not None:
-            logging.debug(url)
+        if xml is None:
+            return
+
+        logging.debug(url)
+
+        from lxml import etree
+
+        if etree.iselement(xml) or isinstance(xml, etree._ElementTree):
+            root = xml
+        else:
             logging.debug(xml)
 
-            try:
-                root = ET.fromstring(xml)
-            except Exception:
+            if isinstance(xml, str):
+                xml = xml.encode('utf-8')
+
+            if not _is_xml_body(xml):
                 return  # This may also be HTML
 
-            # Collect all the info we have on the error
-            for el in root.findall('*//faultcode'):
-                self.codes.append(el.text)
-            for el in root.findall('*//faultstring'):
-                self.messages.append(el.text)
-            for el in root.findall('*//code'):
-                self.codes.append(el.text)
-            for el in root.findall('*//message'):
-                self.messages.append(el.text)
+            try:
+                root = etree.fromstring(xml)
+            except etree.XMLSyntaxError:
+                return
+
+        # Collect all the info we have on the error in one go
+        found = dict((tag, []) for tag in FAULT_CODES + FAULT_MESSAGES)
+
+        for el in root.iter(*found):
+            found[el.tag].append(el.text)
+
+        for tag in FAULT_CODES:
+            self.codes.extend(found[tag])
+        for tag in FAULT_MESSAGES:
+            self.messages.extend(found[tag])
 
     def __str__(self):
         return ' '.join(self.messages)
@@ -213,6 +376,17 @@ class GsxError(Exception):
         return ' '.join(self.messages)
 
 
+class GsxValidationError(GsxError):
+    """
+    A request that failed preflight validation and was never sent.
+    codes holds the paths of the offending fields and messages
+    what's wrong with each of them, so errors maps field to problem.
+    """
+    def __init__(self, errors):
+        self.codes = [e[0] for e in errors]
+        self.messages = [e[1] for e in errors]
+
+
 class GsxConnectionError(GsxError):
     """A more fatal-type HTTP error."""
     def __init__(self, url, code, message):
@@ -220,6 +394,44 @@ class GsxConnectionError(GsxError):
         self.messages.append('%d: %s (%s)' % (code, message, url))
 
 
+# Payload fields whose format preflight() checks, wherever they appear
+FIELD_FORMATS = {
+    'partNumber': re.compile(dict(IDENTIFIERS)['partNumber']).match,
+}
+
+
+def _check_formats(data, path, errors):
+    for k, v in data.items():
+        items = v if isinstance(v, list) else [v]
+        for i, e in enumerate(items):
+            name = path + k + ('[%d]' % i if isinstance(v, list) else '')
+            if isinstance(e, GsxBase):
+                _check_formats(e._data, name + '.', errors)
+            elif k in FIELD_FORMATS and isinstance(e, str) and e:
+                if not FIELD_FORMATS[k](e):
+                    errors.append((name, 'Invalid %s: %s' % (k, e)))
+
+
+def preflight(spec, obj):
+    """
+    Returns a list of (field, problem) tuples for everything
+    that would make GSX reject obj as the payload of method spec.
+
+    >>> preflight(methods.METHODS['CreateStockingOrder'],
+    ...           GsxObject(orderLines=[GsxObject(partNumber='blaa')]))
+    [('purchaseOrderNumber', 'Required field purchaseOrderNumber is missing'), ('orderLines[0].partNumber', 'Invalid partNumber: blaa')]
+    """
+    errors = []
+    data = obj._data
+
+    for field in spec.required:
+        if all(data.get(f) in (None, '', []) for f in field.split('|')):
+            errors.append((field, 'Required field %s is missing' % field.replace('|', ' or ')))
+
+    _check_formats(data, '', errors)
+    return errors
+
+
 class GsxCache(object):
     """The cache creates a separate shelf for each GSX session."""
 
@@ -259,49 +471,151 @@ class GsxCache(object):
         self.shelf[key] = d
         return self
 
+    @classmethod
+    def shelves(cls):
+        """
+        Returns a dict mapping the path of every gsxws shelf
+        in tmpdir to the list of files that back it. Depending on
+        the dbm module in use, a shelf is stored in one or more files
+        (gsxws_<key>.db, gsxws_<key>.db.dat, gsxws_<key>.db.dir...)
+        """
+        result = {}
+        pattern = os.path.join(cls.tmpdir, cls.shelf_prefix + '_*.db*')
+
+        for path in glob.glob(pattern):
+            base = re.match(r'^(.*?\.db)(\.\w+)?$', path)
+            if base is not None:
+                result.setdefault(base.group(1), []).append(path)
+
+        return result
+
+    @staticmethod
+    def _remove(files):
+        """Delete files, returning the number of bytes reclaimed."""
+        reclaimed = 0
+        for f in files:
+            try:
+                size = os.path.getsize(f)
+                os.remove(f)
+                reclaimed += size
+            except OSError:
+                pass
+        return reclaimed
+
+    @staticmethod
+    def _size(files):
+        return sum(os.path.getsize(f) for f in files if os.path.exists(f))
+
+    @classmethod
+    def compact(cls, fp):
+        """
+        Drop expired entries from the shelf at fp and rewrite it
+        so that the space they used is actually given back.
+        Returns the number of bytes reclaimed.
+        """
+        now = datetime.now()
+        files = cls.shelves().get(fp, [])
+        before = cls._size(files)
+
+        shelf = shelve.open(fp, protocol=-1)
+        try:
+            live = {}
+            for k in list(shelf.keys()):
+                d = shelf[k]
+                if d['expires'] > now:
+                    live[k] = d
+        finally:
+            shelf.close()
+
+        cls._remove(files)
+        shelf = shelve.open(fp, flag='n', protocol=-1)
+        try:
+            shelf.update(live)
+        finally:
+            shelf.close()
+
+        return max(before - cls._size(cls.shelves().get(fp, [])), 0)
+
+    @classmethod
+    def sweep(cls, max_age=timedelta(days=1), compact=True, idle=timedelta(minutes=20)):
+        """
+        Remove shelves that haven't been touched in max_age and compact
+        the remaining ones (unless compact is False). Only shelves that
+        have been idle for longer than idle (the default cache expiry)
+        are compacted, so ones still in use are left alone, as are
+        shelves that can't be opened right now (e.g. locked by another
+        process). Returns the number of bytes reclaimed.
+        """
+        import dbm
+        import pickle
+
+        reclaimed = 0
+        now = datetime.now()
+
+        for fp, files in list(cls.shelves().items()):
+            try:
+                mtime = datetime.fromtimestamp(max(os.path.getmtime(f) for f in files))
+            except (OSError, ValueError):
+                continue
+
+            if mtime < now - max_age:
+                reclaimed += cls._remove(files)
+                continue
+
+            if not compact or mtime > now - idle:
+                continue
+
+            try:
+                reclaimed += cls.compact(fp)
+            except dbm.error as e:
+                logging.debug('Skipping cache %s: %s' % (fp, e))
+            except (pickle.UnpicklingError, EOFError, AttributeError,
+                    ImportError, ValueError, KeyError, TypeError) as e:
+                # Corrupt or unreadable (e.g. pickled by another Python version)
+                logging.debug('Removing unreadable cache %s: %s' % (fp, e))
+                reclaimed += cls._remove(cls.shelves().get(fp, files))
+
+        return reclaimed
+
     @classmethod
     def nukeall(cls):
-        """Delete all gsxws caches"""
-        import subprocess
-        path = os.path.join(cls.tmpdir, cls.shelf_prefix) + '*.db'
-        subprocess.call('/bin/rm ' + path, shell=True)
+        """Delete all gsxws caches. Returns the number of bytes reclaimed."""
+        reclaimed = 0
+        for files in list(cls.shelves().values()):
+            reclaimed += cls._remove(files)
+        return reclaimed
 
     def nuke(self):
         """Delete this cache."""
-        os.remove(self.fp)
+        self.shelf.close()
+        return self._remove(self.shelves().get(self.fp, []))
 
 
 class GsxRequest(object):
     """Creates and submits the SOAP envelope."""
 
-    env     = None
+    env     = None # The SOAP envelope that was last submitted
     obj     = None # The GsxObject being submitted
-    data    = None # The GsxObject payload in XML format
-    body    = None # The Body part of the SOAP envelope
 
+    _url = None
     _request = ""
     _response = ""
 
     def __init__(self, **kwargs):
-        "Construct the SOAP envelope."
+        "Prepare the payload of the SOAP envelope."
         self.objects = []
-        self.env = ET.Element("soapenv:Envelope")
-        self.env.set("xmlns:core", "http://gsxws.apple.com/elements/core")
-        self.env.set("xmlns:glob", "http://gsxws.apple.com/elements/global")
-        self.env.set("xmlns:asp", "http://gsxws.apple.com/elements/core/asp")
-        self.env.set("xmlns:soapenv", "http://schemas.xmlsoap.org/soap/envelope/")
-        self.env.set("xmlns:emea", "http://gsxws.apple.com/elements/core/asp/emea")
-
-        ET.SubElement(self.env, "soapenv:Header")
-        self.body = ET.SubElement(self.env, "soapenv:Body")
         self.xml_response = ''
 
         for k, v in list(kwargs.items()):
             self.obj = v
             self._request = k
-            self.data = v.to_xml(self._request)
             self._response = k.replace("Request", "Response")
 
+    @property
+    def data(self):
+        "The GsxObject payload in XML format"
+        return self.obj.to_xml(self._request)
+
     def _send(self, method, xmldata):
         "Send the final SOAP message"
         global GSX_ENV, GSX_REGION, GSX_HOSTS, GSX_URL, GSX_TIMEOUT
@@ -328,73 +642,148 @@ class GsxRequest(object):
         except KeyError as e:
             raise GsxError('SSL configuration error: %s' % e)
 
+        import requests
+
         try:
             return requests.post(self._url, cert=(self.gsx_cert, self.gsx_key),
                                  data=xmldata,
                                  headers=headers,
-                                 timeout=GSX_TIMEOUT)
+                                 timeout=GSX_TIMEOUT,
+                                 stream=True)
         except Exception as e:
             raise GsxError('GSX connection failed: %s' % e)
 
-    def _submit(self, method, response=None, raw=False):
-        "Constructs and submits the final SOAP message"
-        root = ET.SubElement(self.body, self.obj._namespace + method)
+    def _receive(self, res):
+        """
+        Reads the body of the response as is (no decoding) into a file
+        that stays in memory up to GSX_SPOOL_SIZE and moves to disk after.
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=GSX_SPOOL_SIZE)
 
-        if method is "Authenticate":
-            root.append(self.data)
-        else:
-            request_name = method + "Request"
+        try:
+            for chunk in res.iter_content(GSX_CHUNK_SIZE):
+                body.write(chunk)
+        except Exception as e:
+            body.close()
+            raise GsxError('GSX connection failed: %s' % e)
+        finally:
+            res.close()
+
+        body.seek(0)
+        return body
 
-            # @hack for Reported Symptom/Issue API which nests two ReportedSymptomIssueRequest elements
-            if method.endswith("Request"):
-                request_name = method
+    def _submit(self, method, response=None, raw=False, materialize=False, stream=False):
+        """
+        Constructs and submits the final SOAP message.
+        With materialize=True the result is copied into GsxRecords
+        and the parsed tree is dropped. With stream=True the result
+        is an iterator of GsxRecords, parsed one at a time. Large
+        responses to materialize are parsed in GSX_PARSE_POOL, if there is one.
+        """
+        from lxml import etree
+        from . import objectify
 
-            # @hack FetchDiagnosticDetails doesn't follow the naming conventions
-            if method.endswith('FetchDiagnosticDetails'):
-                request_name = 'FetchDiagnosticDetailsRequestData'
+        spec = methods.get(method, getattr(self.obj, '_namespace', ''))
 
-            # @hack FetchDiagnosticSuites doesn't follow the naming conventions
-            if method.endswith('FetchDiagnosticSuites'):
-                request_name = 'FetchDiagnosticSuitesRequestData'
+        for old, new in spec.aliases.items():
+            self.obj.rename(old, new)
 
-            # @hack RunDiagnosticTest doesn't follow the naming conventions
-            if method.endswith('RunDiagnosticTest'):
-                request_name = 'RunDiagnosticTestRequestData'
+        if GSX_PREFLIGHT:
+            errors = preflight(spec, self.obj)
+            if errors:
+                raise GsxValidationError(errors)
 
-            request = ET.SubElement(root, request_name)
-            request.append(GSX_SESSION)
+        envelope = tempfile.SpooledTemporaryFile(max_size=GSX_SPOOL_SIZE)
 
-            if self._request == request_name:
-                # Some requests lack a top-level container
-                request.extend(self.data)
+        try:
+            write = envelope.write
+            write(spec.prefix)
+
+            if spec.request is None:
+                self.obj.write_xml(self._request, write)
+            else:
+                write(etree.tostring(GSX_SESSION))
+                if self._request == spec.request:
+                    # Some requests lack a top-level container
+                    self.obj.write_children(write)
+                else:
+                    self.obj.write_xml(self._request, write)
+
+            write(spec.suffix)
+            size = envelope.tell()
+            envelope.seek(0)
+
+            if size > GSX_SPOOL_SIZE:
+                # Big attachments - let requests stream the body from disk
+                res = self._send(method, envelope)
             else:
-                request.append(self.data)
+                self.env = envelope.read()
+                res = self._send(method, self.env)
+        finally:
+            envelope.close()
 
-        data = ET.tostring(self.env, 'UTF-8')
-        res = self._send(method, data)
-        xml = res.text.encode('utf8')
-        self.xml_response = xml
+        body = self._receive(res)
+        streaming = False
 
-        logging.debug("Response: %s %s %s" % (res.status_code, res.reason, xml))
+        try:
+            if GSX_KEEP_RESPONSE or res.status_code > 200 or \
+                    logging.getLogger().isEnabledFor(logging.DEBUG):
+                xml = body.read()
+                body.seek(0)
+                logging.debug("Response: %s %s %s" % (res.status_code, res.reason, xml))
+                if GSX_KEEP_RESPONSE:
+                    self.xml_response = xml
 
-        if res.status_code > 400:
-            raise GsxConnectionError(self._url, res.status_code, res.reason)
+            if res.status_code > 400:
+                raise GsxConnectionError(self._url, res.status_code, res.reason)
 
-        if res.status_code > 200:
-            raise GsxError(xml=xml, url=self._url, status=res.status_code, message=res.reason)
+            if res.status_code > 200:
+                raise GsxError(xml=xml, url=self._url, status=res.status_code,
+                               message=res.reason)
 
-        if raw is True:
-            return ET.fromstring(self.xml_response)
+            response = response or spec.response or self._response
+
+            if stream:
+                streaming = True
+                return self._stream(body, response)
+
+            # Each response is parsed exactly once, either as is or objectified
+            if raw is True:
+                return etree.parse(body).getroot()
+
+            size = body.seek(0, os.SEEK_END)
+            body.seek(0)
+
+            if materialize and GSX_PARSE_POOL is not None and size >= GSX_POOL_SIZE:
+                job = GSX_PARSE_POOL.submit(objectify.parse_records, body.read(), response)
+                self.objects = job.result()
+                return self.objects
+
+            self.objects = objectify.parse_file(body, response)
+        finally:
+            if not streaming:
+                body.close()
+
+        if materialize:
+            self.objects = objectify.materialize(self.objects)
 
-        response = response or self._response
-        self.objects = objectify.parse(xml, response)
         return self.objects
 
+    @staticmethod
+    def _stream(body, response):
+        from . import objectify
+
+        try:
+            for record in objectify.iterparse(body, response):
+                yield record
+        finally:
+            body.close()
+
     def __unicode__(self):
-        return ET.tostring(self.env)
+        return (self.env or b'').decode('utf-8')
 
     def __str__(self):
-        return str(self).encode('utf8')
+        return self.__unicode__()
 
 
 class GsxResponse:
@@ -405,14 +794,18 @@ class GsxResponse:
         self.el_response = el_response
 
         if http_response.status_code > 200:
-            raise GsxError(xml=xml, url=self._url)
-
-        self.response = objectify.parse(xml, self.el_response)
+            raise GsxError(xml=xml, url=http_response.url)
 
         logging.debug("Response: %s %s %s" % (http_response.status_code, http_response.reason, xml))
 
+        from lxml import etree
+        from . import objectify
+
         if raw is True:
-            return ET.fromstring(self.xml_response)
+            self.response = etree.fromstring(xml)
+            return
+
+        self.response = objectify.parse(xml, self.el_response)
 
         if hasattr(self.response, 'outCome'):
             self.result = self.response.outCome
@@ -426,35 +819,85 @@ class GsxResponse:
         return self.response if len(self.response) > 1 else self.response[0]
 
 
-class GsxObject(object):
-    """XML/SOAP representation of a GSX object."""
+class GsxFile(object):
+    """
+    A file that is sent to GSX as base64-encoded data.
+    The file is only read (in chunks) when the request is serialized.
+    Files given as paths are opened and closed right there, file
+    objects are read from their current position and left open -
+    so they must stay open until the request has been submitted.
+    """
+    chunk_size = 3 * 256 * 1024  # divisible by 3, so full reads encode as is
 
-    _data = {}
+    def __init__(self, f):
+        self.path, self.fp, self.start = None, None, None
 
-    def __init__(self, *args, **kwargs):
-        self._data = {}
-        self._formats = get_format()
+        if isinstance(f, str):
+            self.path = f
+        else:
+            self.fp = f
+            try:
+                self.start = f.tell()
+            except Exception:
+                pass
+
+    def _chunks(self, fp):
+        if self.start is not None:
+            fp.seek(self.start)
+
+        # Reads can come up short (pipes, sockets), base64 padding
+        # may only appear at the very end, so encode in multiples
+        # of 3 bytes and carry the rest over to the next read
+        rest = b''
+        while True:
+            chunk = fp.read(self.chunk_size)
+            if not chunk:
+                break
+            if rest:
+                chunk = rest + chunk
+            end = len(chunk) - len(chunk) % 3
+            rest = chunk[end:]
+            if end:
+                yield base64.b64encode(chunk[:end])
+
+        if rest:
+            yield base64.b64encode(rest)
+
+    def chunks(self):
+        """Yields the contents of the file base64-encoded, chunk by chunk."""
+        if self.fp is not None:
+            if getattr(self.fp, 'closed', False):
+                raise ValueError('%s was closed before the request was sent, '
+                                 'keep it open until then or pass its path'
+                                 % getattr(self.fp, 'name', 'The file'))
+            for chunk in self._chunks(self.fp):
+                yield chunk
+            return
 
-        for a in args:
-            k = validate(a)
-            if k is not None:
-                kwargs[k] = a
+        with open(self.path, 'rb') as fp:
+            for chunk in self._chunks(fp):
+                yield chunk
 
-        for k, v in list(kwargs.items()):
-            self.__setattr__(k, v)
+    def encode(self):
+        return b''.join(self.chunks()).decode('ascii')
 
-    def __setattr__(self, name, value):
-        if name.startswith("_"):
-            super(GsxObject, self).__setattr__(name, value)
-            return
 
+class GsxBase(object):
+    """
+    What GsxObjects and GsxStructs have in common: converting values
+    and writing themselves out as XML. Subclasses provide _data.
+    """
+    __slots__ = ()
+
+    def _convert(self, value):
+        "Converts value to what GSX expects"
         # Kind of a lame way to identify files, but it's the best
         # we have for Django's File class right now...
         if hasattr(value, "fileno"):
             if not hasattr(self, "fileName"):
                 self.fileName = value.name
 
-            value = base64.b64encode(value.read())
+            value = GsxFile(value)
 
         if isinstance(value, bool):
             value = "Y" if value else "N"
@@ -468,24 +911,19 @@ class GsxObject(object):
         if isinstance(value, time):
             value = value.strftime(self._formats['tf'])
 
-        self._data[name] = value
+        return value
 
-    def __getattr__(self, name):
-        try:
-            return self._data[name]
-        except KeyError:
-            raise AttributeError("Invalid attribute: %s" % name)
-
-    def unset(self, prop):
-        del(self._data[prop])
+    @property
+    def _formats(self):
+        return get_format()
 
-    def _submit(self, arg, method, ret=None, raw=False):
-        """Shortcut for submitting a GsxObject."""
-        self._req = GsxRequest(**{arg: self})
-        result = self._req._submit(method, ret, raw)
-        if result is None:
-            raise GsxError('GSX request returned empty result')
-        return result if len(result) > 1 else result[0]
+    def rename(self, old, new):
+        "Moves the value of field old (if it's set) to field new"
+        data = self._data
+        if old in data:
+            value = data[old]
+            self.unset(old)
+            setattr(self, new, value)
 
     def to_xml(self, root):
         """
@@ -494,32 +932,293 @@ class GsxObject(object):
         >>> GsxObject(spam='eggs', spices=[{'salt': 'pepper'}]) #doctest: +ELLIPSIS
         <__main__.GsxObject object at 0x...
         >>> GsxObject(spam='eggs', spices=[{'salt': 'pepper'}]).to_xml('blaa') #doctest: +ELLIPSIS
-        <Element 'blaa' at 0x...
+        <Element blaa at 0x...
         """
-        root = ET.Element(root)
+        from lxml import etree
+
+        root = etree.Element(root)
         for k, v in list(self._data.items()):
             if isinstance(v, list):
                 for e in v:
-                    if isinstance(e, GsxObject):
-                        i = ET.SubElement(root, k)
+                    if isinstance(e, GsxBase):
+                        i = etree.SubElement(root, k)
                         i.extend(e.to_xml(k))
             else:
-                el = ET.SubElement(root, k)
-                if isinstance(v, str):
+                el = etree.SubElement(root, k)
+                if isinstance(v, str) and v:
                     el.text = v
-                if isinstance(v, GsxObject):
+                if isinstance(v, GsxFile):
+                    el.text = v.encode() or None
+                if isinstance(v, GsxBase):
                     el.extend(v.to_xml(k))
 
         return root
 
+    @staticmethod
+    def _has_children(data):
+        for v in data.values():
+            if not isinstance(v, list):
+                return True
+            for e in v:
+                if isinstance(e, GsxBase):
+                    return True
+        return False
+
+    def write_children(self, write, data=None):
+        """Writes the child elements of this object as UTF-8 encoded XML."""
+        if data is None:
+            data = self._data
+
+        for k, v in data.items():
+            if isinstance(v, list):
+                for e in v:
+                    if isinstance(e, GsxBase):
+                        e.write_xml(k, write)
+            elif isinstance(v, GsxBase):
+                v.write_xml(k, write)
+            elif isinstance(v, str) and v:
+                write(b'<%s>%s</%s>' % (k.encode(), xml_escape(v).encode('utf-8'), k.encode()))
+            elif isinstance(v, GsxFile):
+                self._write_file(k, v, write)
+            else:
+                write(b'<%s/>' % k.encode())
+
+    @staticmethod
+    def _write_file(tag, f, write):
+        tag = tag.encode()
+        chunks = f.chunks()
+        first = next(chunks, None)
+
+        if first is None:
+            write(b'<%s/>' % tag)
+            return
+
+        write(b'<%s>' % tag)
+        write(first)
+        for chunk in chunks:
+            write(chunk)
+        write(b'</%s>' % tag)
+
+    def write_xml(self, root, write):
+        """
+        Writes this object as UTF-8 encoded XML into the write callable
+        (such as the write method of a file or a buffer) without
+        building an element tree first. The output is identical to
+        etree.tostring(self.to_xml(root), encoding='UTF-8').
+        """
+        tag, data = root.encode(), self._data
+        if not self._has_children(data):
+            write(b'<%s/>' % tag)
+            return
+
+        write(b'<%s>' % tag)
+        self.write_children(write, data)
+        write(b'</%s>' % tag)
+
+    def to_bytes(self, root):
+        """
+        Returns this object as UTF-8 encoded XML
+
+        >>> GsxObject(spam='eggs & ham').to_bytes('blaa')
+        b'<blaa><spam>eggs &amp; ham</spam></blaa>'
+        """
+        chunks = []
+        self.write_xml(root, chunks.append)
+        return b''.join(chunks)
+
     def dumps(self):
-        req = GsxRequest(**{'GsxObject': self})
-        return ET.tostring(req.data, encoding='utf-8')
+        return self.to_bytes('GsxObject')
 
     def __str__(self):
         return str(self._data)
 
 
+class GsxObject(GsxBase):
+    """XML/SOAP representation of a GSX object."""
+
+    _data = {}
+
+    def __init__(self, *args, **kwargs):
+        self._data = {}
+
+        for a in args:
+            k = validate(a)
+            if k is not None:
+                kwargs[k] = a
+
+        for k, v in list(kwargs.items()):
+            self.__setattr__(k, v)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            super(GsxObject, self).__setattr__(name, value)
+            return
+
+        self._data[name] = self._convert(value)
+
+    def __getattr__(self, name):
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError("Invalid attribute: %s" % name)
+
+    def unset(self, prop):
+        del(self._data[prop])
+
+    def _submit(self, arg, method, ret=None, raw=False, materialize=False, stream=False):
+        """Shortcut for submitting a GsxObject."""
+        self._req = GsxRequest(**{arg: self})
+        result = self._req._submit(method, ret, raw, materialize, stream)
+        if stream:
+            return result
+        if result is None:
+            raise GsxError('GSX request returned empty result')
+        return result if len(result) > 1 else result[0]
+
+
+def _text(obj, value):
+    return value if value.__class__ is str else obj._convert(value)
+
+
+def _flag(obj, value):
+    if value is True:
+        return "Y"
+    if value is False:
+        return "N"
+    return obj._convert(value)
+
+
+def _number(obj, value):
+    return str(value) if value.__class__ is int else obj._convert(value)
+
+
+def _date(obj, value):
+    if isinstance(value, date):
+        return value.strftime(get_format()['df'])
+    return obj._convert(value)
+
+
+def _time(obj, value):
+    if isinstance(value, time):
+        return value.strftime(get_format()['tf'])
+    return obj._convert(value)
+
+
+def _as_is(obj, value):
+    return value
+
+
+FIELD_CONVERTERS = {str: _text, bool: _flag, int: _number, date: _date, time: _time}
+
+
+class GsxSchema(type):
+    """
+    Builds a GsxStruct from its annotated class attributes.
+    Each field gets a slot and a converter picked once based on the
+    field type. Class-level values become the defaults returned for
+    fields that haven't been set.
+    """
+    def __new__(mcs, name, bases, attrs):
+        fields = attrs.get('__annotations__', {})
+        defaults = {}
+
+        for k in fields:
+            if k in attrs:
+                defaults[k] = attrs.pop(k)
+
+        attrs['__slots__'] = tuple(attrs.get('__slots__', ())) + tuple(fields)
+        cls = super(GsxSchema, mcs).__new__(mcs, name, bases, attrs)
+
+        cls._fields = getattr(cls, '_fields', ()) + tuple(fields)
+        cls._defaults = dict(getattr(cls, '_defaults', {}), **defaults)
+        cls._converters = dict(getattr(cls, '_converters', {}))
+
+        for k, t in fields.items():
+            cls._converters[k] = FIELD_CONVERTERS.get(t, _as_is)
+
+        cls._bits = dict((k, 1 << i) for i, k in enumerate(cls._fields))
+
+        return cls
+
+
+class GsxStruct(GsxBase, metaclass=GsxSchema):
+    """
+    Like a GsxObject, but with a fixed set of fields, declared as annotated
+    class attributes. Fields are stored in slots, not in a dict,
+    and converted according to their type. Fields outside the schema
+    can still be set and are sent after the declared ones.
+
+    >>> class Part(GsxStruct):
+    ...     partNumber: str = ''
+    ...     quantity: int
+    >>> Part(quantity=2, comment='Thanks')._data
+    {'quantity': '2', 'comment': 'Thanks'}
+    """
+    __slots__ = ('_extra', '_set',)
+
+    def __init__(self, *args, **kwargs):
+        object.__setattr__(self, '_extra', None)
+        object.__setattr__(self, '_set', 0)
+
+        for a in args:
+            k = validate(a)
+            if k is not None:
+                kwargs[k] = a
+
+        for k, v in kwargs.items():
+            self.__setattr__(k, v)
+
+    def __setattr__(self, name, value):
+        convert = self._converters.get(name)
+
+        if convert is not None:
+            object.__setattr__(self, name, convert(self, value))
+            object.__setattr__(self, '_set', self._set | self._bits[name])
+        elif name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            if self._extra is None:
+                object.__setattr__(self, '_extra', {})
+            self._extra[name] = self._convert(value)
+
+    def __getattr__(self, name):
+        # Only called for fields that haven't been set
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        try:
+            return self._defaults[name]
+        except KeyError:
+            pass
+
+        try:
+            return self._extra[name]
+        except (KeyError, TypeError):
+            raise AttributeError("Invalid attribute: %s" % name)
+
+    @property
+    def _data(self):
+        data, mask = {}, self._set
+        if mask:
+            for k in self._fields:
+                if mask & self._bits[k]:
+                    data[k] = object.__getattribute__(self, k)
+
+        if self._extra:
+            data.update(self._extra)
+
+        return data
+
+    def unset(self, prop):
+        if prop in self._converters:
+            object.__delattr__(self, prop)
+            object.__setattr__(self, '_set', self._set & ~self._bits[prop])
+        elif self._extra and prop in self._extra:
+            del self._extra[prop]
+        else:
+            raise KeyError(prop)
+
+
 class GsxRequestObject(GsxObject):
     "The GSX-friendly representation of this GsxObject"
     pass
@@ -548,24 +1247,27 @@ class GsxSession(GsxObject):
         self._cache = GsxCache(self._cache_key)
 
     def get_session(self):
-        session = ET.Element("userSession")
-        session_id = ET.SubElement(session, "userSessionId")
+        from lxml import etree
+
+        session = etree.Element("userSession")
+        session_id = etree.SubElement(session, "userSessionId")
         session_id.text = self._session_id
         return session
 
     def login(self):
         global GSX_SESSION
-        session = self._cache.get("session")
+        # Cache the ID, not the element - lxml elements can't be pickled
+        session_id = self._cache.get("session_id")
 
-        if session is not None:
-            GSX_SESSION = session
+        if session_id is not None:
+            self._session_id = session_id
         else:
             self._req = GsxRequest(AuthenticateRequest=self)
             result = self._req._submit("Authenticate")
             self._session_id = str(result.userSessionId)
-            GSX_SESSION = self.get_session()
-            self._cache.set("session", GSX_SESSION)
+            self._cache.set("session_id", self._session_id)
 
+        GSX_SESSION = self.get_session()
         return GSX_SESSION
 
     def logout(self):
@@ -577,9 +1279,17 @@ def connect(user_id, sold_to,
             language=GSX_LANG,
             timezone="CEST",
             region=GSX_REGION,
-            locale=GSX_LOCALE):
+            locale=GSX_LOCALE,
+            preflight=GSX_PREFLIGHT,
+            keep_response=GSX_KEEP_RESPONSE,
+            parse_pool=GSX_PARSE_POOL):
     """
     Establish connection with GSX Web Services.
+    With preflight=True, requests are validated locally
+    and invalid ones raise GsxValidationError without being sent.
+    With keep_response=True, the raw body of each response is kept
+    in GsxRequest.xml_response.
+    parse_pool is an executor for parsing large responses (see GSX_PARSE_POOL).
 
     Returns the session ID of the new connection.
     """
@@ -587,11 +1297,17 @@ def connect(user_id, sold_to,
     global GSX_LANG
     global GSX_LOCALE
     global GSX_REGION
+    global GSX_PREFLIGHT
+    global GSX_KEEP_RESPONSE
+    global GSX_PARSE_POOL
 
     GSX_ENV     = environment
     GSX_LANG    = language
     GSX_REGION  = region
     GSX_LOCALE  = locale
+    GSX_PREFLIGHT = preflight
+    GSX_KEEP_RESPONSE = keep_response
+    GSX_PARSE_POOL = parse_pool
 
     act = GsxSession(user_id, sold_to, language, timezone)
     return act.login()
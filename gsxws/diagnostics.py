@@ -19,16 +19,18 @@ class Diagnostics(GsxObject):
 
         return self._req.objects.ticketNumber
 
-    def fetch(self):
+    def fetch(self, materialize=False):
         """
         The Fetch Diagnostic Details API allows users to fetch diagnostic test details 
         of all Devices. This API will retrieve diagnostic tests performed on 
         the device as well as profile and report data for the tests. 
+        With materialize=True the details are returned as GsxRecords
+        (and large responses parsed in GSX_PARSE_POOL).
 
         >>> Diagnostics(diagnosticEventNumber='12942008007242012052919').fetch()
         """
         self._submit("diagnosticDetailsRequestData", "FetchDiagnosticDetails",
-                     "diagnosticDetailsResponseData")
+                     "diagnosticDetailsResponseData", materialize=materialize)
         return self._req.objects
 
     def fetch_suites(self):
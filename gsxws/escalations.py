@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os.path
-from .core import GsxObject
+from .core import GsxObject, GsxFile
 from .lookups import Lookup
 
 STATUS_OPEN = 'O'
@@ -56,7 +56,7 @@ class FileAttachment(GsxObject):
     def __init__(self, fp):
         super(FileAttachment, self).__init__()
         self.fileName = os.path.basename(fp)
-        self.fileData = open(fp, 'rb')
+        self.fileData = GsxFile(fp)
 
 
 class Escalation(GsxObject):
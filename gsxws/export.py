@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Column-oriented tables of bulk GSX results for fleet analytics.
+
+columns() turns results (GsxRecords, GsxElements or dicts, such as
+a streamed lookup) into one array per field in a single pass:
+dates and timestamps become datetime64, booleans bool and numbers
+float64/int64 NumPy arrays, strings are dictionary-encoded.
+to_arrow() and to_parquet() hand those over to PyArrow.
+
+write_jsonl() writes results as JSON Lines as they come, one
+object per result, with dates as ISO 8601 strings and prices
+as numbers.
+
+NumPy (and PyArrow for Arrow/Parquet) is only imported when used.
+The latest coverage end date of each model in a list of warranties:
+
+    cols = columns(warranties)
+    ends = cols['coverageEndDate']
+    models = cols['productDescription']
+    [ends[models == m].max() for m in models.categories]
+"""
+
+import json
+from datetime import date, datetime
+
+from .core import GsxBase
+from .objectify import GsxRecord, GsxElement, GsxAttachment, _record
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('gsxws.export needs NumPy (pip install numpy)')
+    return numpy
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Arrow and Parquet output needs PyArrow (pip install pyarrow)')
+    return pyarrow
+
+
+class DictColumn(object):
+    """
+    A dictionary-encoded string column: categories holds the distinct
+    strings and codes the index of each value in it (-1 for missing).
+    Comparing with a string gives a boolean mask without touching
+    the strings themselves.
+    """
+    __slots__ = ('codes', 'categories',)
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        codes = self.codes[index]
+        if isinstance(codes, _numpy().ndarray):
+            return DictColumn(codes, self.categories)
+        return None if codes < 0 else self.categories[codes]
+
+    def __eq__(self, other):
+        try:
+            code = self.categories.tolist().index(other)
+        except ValueError:
+            return _numpy().zeros(len(self.codes), dtype=bool)
+        return self.codes == code
+
+    def __ne__(self, other):
+        return ~(self == other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<DictColumn %d values, %d categories>' % (len(self.codes), len(self.categories))
+
+    def decode(self):
+        """Returns the values as an object array, None for missing."""
+        np = _numpy()
+        values = np.append(self.categories.astype(object), None)
+        return values[self.codes]
+
+
+def _items(result):
+    if isinstance(result, dict):
+        return result.items()
+    if isinstance(result, GsxElement):
+        result = _record(result)
+    if isinstance(result, GsxRecord):
+        return zip(result._fields, result._values)
+    raise TypeError('Cannot export %r' % result)
+
+
+def _column(values):
+    np = _numpy()
+
+    present = [v for v in values if v is not None]
+    kinds = set(type(v) for v in present)
+
+    if len(kinds) != 1:
+        if kinds == set((int, float)):
+            kinds = set((float,))
+        elif kinds:
+            return np.array(values, dtype=object)
+        else:
+            return np.full(len(values), None, dtype=object)
+
+    kind = kinds.pop()
+
+    if kind is bool:
+        # Missing booleans are False, like anything but Y or true in GSX
+        return np.array([v is True for v in values], dtype=bool)
+    if kind is datetime:
+        return np.array(values, dtype='datetime64[s]')
+    if kind is date:
+        return np.array(values, dtype='datetime64[D]')
+    if kind is float or (kind is int and len(present) < len(values)):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if kind is int:
+        return np.array(values, dtype=np.int64)
+    if kind is str:
+        codes, categories = [], {}
+        for v in values:
+            codes.append(-1 if v is None else categories.setdefault(v, len(categories)))
+        return DictColumn(np.array(codes, dtype=np.int32),
+                          np.array(list(categories), dtype=object))
+
+    # Nested records, lists, attachments
+    return np.array(values, dtype=object)
+
+
+def columns(results, fields=None):
+    """
+    Returns the given fields (all fields found by default) of results
+    as a dict of columns. results can be any iterable, it's consumed
+    once. Fields missing from a result are None in its row.
+    """
+    data = {}
+    count = 0
+
+    for result in results:
+        for k, v in _items(result):
+            if fields is not None and k not in fields:
+                continue
+            try:
+                data[k].append(v)
+            except KeyError:
+                data[k] = [None] * count + [v]
+
+        count += 1
+
+        for column in data.values():
+            if len(column) < count:
+                column.append(None)
+
+    names = fields if fields is not None else list(data)
+    return dict((k, _column(data.get(k, [None] * count))) for k in names)
+
+
+def to_arrow(cols):
+    """
+    Returns the columns (see columns()) as a pyarrow Table.
+    Object columns (nested records, lists) are written as strings.
+    """
+    pa = _arrow()
+    arrays = []
+
+    for column in cols.values():
+        if isinstance(column, DictColumn):
+            indices = pa.array(column.codes, mask=column.codes < 0)
+            array = pa.DictionaryArray.from_arrays(indices, pa.array(column.categories,
+                                                                     type=pa.string()))
+        elif column.dtype == object:
+            array = pa.array([None if v is None else str(v) for v in column], type=pa.string())
+        else:
+            array = pa.array(column, from_pandas=True)
+        arrays.append(array)
+
+    return pa.Table.from_arrays(arrays, names=list(cols))
+
+
+def to_parquet(cols, path, **kwargs):
+    """Writes the columns (see columns()) to a Parquet file at path."""
+    pa = _arrow()
+    pa.parquet.write_table(to_arrow(cols), path, **kwargs)
+
+
+class GsxEncoder(json.JSONEncoder):
+    """
+    Encodes GSX results and requests: records and elements as objects,
+    dates and timestamps in ISO 8601, attachments as the base64
+    data GSX sent.
+    """
+    def default(self, o):
+        if isinstance(o, date):
+            return o.isoformat()
+        if isinstance(o, GsxElement):
+            o = _record(o)
+        if isinstance(o, GsxRecord):
+            return dict(zip(o._fields, o._values))
+        if isinstance(o, GsxAttachment):
+            return o.encoded
+        if isinstance(o, GsxBase):
+            return o._data
+        return super(GsxEncoder, self).default(o)
+
+
+def write_jsonl(results, fp):
+    """
+    Writes results (a lookup result, a streamed lookup, any iterable
+    of results or lists of them) to the text file fp as JSON Lines,
+    one result at a time. Returns the number of lines written.
+    """
+    encode = GsxEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    count = 0
+
+    if isinstance(results, (GsxElement, GsxRecord)):
+        results = [results]
+
+    for result in results:
+        # Bulk results come in lists and elements with their siblings
+        for r in (result if isinstance(result, (list, GsxElement)) else (result,)):
+            fp.write(encode(r))
+            fp.write('\n')
+            count += 1
+
+    return count
@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 
-import base64
 import logging
-import tempfile
 from datetime import date
 
 from .core import GsxObject, connect
@@ -13,11 +11,21 @@ class Lookup(GsxObject):
         super(Lookup, self).__init__(*args, **kwargs)
         self._namespace = "asp:"
 
-    def lookup(self, method, response="lookupResponseData"):
-        result = self._submit("lookupRequestData", method, response)
-        return [result] if isinstance(result, dict) else result
+    def lookup(self, method, response="lookupResponseData", materialize=False, stream=False):
+        """
+        Materialized results are always returned as a list of GsxRecords.
+        Streamed results are an iterator of GsxRecords that parses the
+        response as it goes, so only one result is in memory at a time.
+        """
+        result = self._submit("lookupRequestData", method, response,
+                              materialize=materialize, stream=stream)
+        if stream:
+            return result
 
-    def parts(self):
+        from .objectify import GsxRecord
+        return [result] if isinstance(result, (dict, GsxRecord)) else result
+
+    def parts(self, materialize=False, stream=False):
         """
         The Parts Lookup API allows users to access part and part pricing data prior to
         creating a repair or order. Parts lookup is also a good way to search for
@@ -25,9 +33,9 @@ class Lookup(GsxObject):
         (config code, EEE code, serial number, etc.).
         """
         self._namespace = "core:"
-        return self.lookup("PartsLookup", "parts")
+        return self.lookup("PartsLookup", "parts", materialize, stream)
 
-    def repairs(self):
+    def repairs(self, materialize=False, stream=False):
         """
         The Repair Lookup API mimics the front-end repair search functionality.
         It fetches up to 2500 repairs in a given criteria.
@@ -37,7 +45,7 @@ class Lookup(GsxObject):
         >>> Lookup(serialNumber='DGKFL06JDHJP').repairs() # doctest: +ELLIPSIS
         [{'customerName': 'Lepalaan,Filipp',...
         """
-        return self.lookup("RepairLookup")
+        return self.lookup("RepairLookup", materialize=materialize, stream=stream)
 
     def invoices(self):
         """
@@ -53,14 +61,11 @@ class Lookup(GsxObject):
         """
         The Invoice Details Lookup API allows AASP users to
         download invoice for a given invoice id.
+        The invoice PDF is in invoiceData (a GsxAttachment).
+
         >>> Lookup(invoiceID=9670348809).invoice_details()
         """
-        result = self.lookup("InvoiceDetailsLookup")
-        pdf = base64.b64decode(result.invoiceData)
-        outfile = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
-        outfile.write(pdf)
-        result.invoiceData = outfile.name
-        return result
+        return self.lookup("InvoiceDetailsLookup")
 
     def component_check(self, parts=[]):
         """
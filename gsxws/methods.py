@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of the GSX API methods and how each one is wrapped
+in the SOAP envelope.
+"""
+
+ENVELOPE_NAMESPACES = (
+    ('core', "http://gsxws.apple.com/elements/core"),
+    ('glob', "http://gsxws.apple.com/elements/global"),
+    ('asp', "http://gsxws.apple.com/elements/core/asp"),
+    ('soapenv', "http://schemas.xmlsoap.org/soap/envelope/"),
+    ('emea', "http://gsxws.apple.com/elements/core/asp/emea"),
+)
+
+ENVELOPE_START = '<soapenv:Envelope %s><soapenv:Header /><soapenv:Body>' % ' '.join(
+    'xmlns:%s="%s"' % ns for ns in ENVELOPE_NAMESPACES
+)
+ENVELOPE_END = '</soapenv:Body></soapenv:Envelope>'
+
+
+class GsxMethod(object):
+    """
+    A GSX API method.
+
+    namespace is the prefix of the method element,
+    request is the element (inside the method element) that holds
+    the user session and the payload, or None if the payload goes
+    directly inside the method element without a session (Authenticate).
+    response is the element holding the result in the response
+    (if the caller doesn't ask for a specific one).
+    required lists the payload fields GSX insists on, alternatives
+    separated with a pipe. aliases maps field names used elsewhere
+    to the names this method expects instead.
+
+    >>> METHODS['RunDiagnosticTest'].prefix # doctest: +ELLIPSIS
+    b'<soapenv:Envelope ...><glob:RunDiagnosticTest><RunDiagnosticTestRequestData>'
+    """
+    __slots__ = ('name', 'namespace', 'request', 'response', 'required', 'aliases',
+                 'prefix', 'suffix',)
+
+    def __init__(self, name, namespace, request='', response=None, required=(), aliases=None):
+        self.name = name
+        self.namespace = namespace
+        self.request = (name + 'Request') if request == '' else request
+        self.response = response
+        self.required = required
+        self.aliases = aliases or {}
+
+        start, end = ENVELOPE_START, ENVELOPE_END
+        start += '<%s%s>' % (namespace, name)
+        end = '</%s%s>' % (namespace, name) + end
+
+        if self.request:
+            start += '<%s>' % self.request
+            end = '</%s>' % self.request + end
+
+        self.prefix = start.encode('utf-8')
+        self.suffix = end.encode('utf-8')
+
+    def __repr__(self):
+        return '<GsxMethod %s%s>' % (self.namespace, self.name)
+
+
+UNIT = 'serialNumber|alternateDeviceId'
+
+# Carry-In and Onsite repairs use different names for the same things
+ONSITE_ALIASES = {
+    'shipTo': 'shippingLocation',
+    'poNumber': 'purchaseOrderNumber',
+    'diagnosedByTechId': 'technicianName',
+    'requestReviewByApple': 'requestReview',
+}
+
+METHODS = dict((m.name, m) for m in (
+    GsxMethod('Authenticate', 'glob:', None, 'AuthenticateResponse',
+              ('userId', 'serviceAccountNo')),
+    # Products
+    GsxMethod('FetchProductModel', 'glob:', response='productModelResponse'),
+    GsxMethod('WarrantyStatus', 'glob:', response='warrantyDetailInfo', required=(UNIT,)),
+    GsxMethod('FetchIOSActivationDetails', 'glob:', response='activationDetailsInfo',
+              required=(UNIT,)),
+    GsxMethod('ComptiaCodeLookup', 'glob:', response='comptiaInfo'),
+    # Diagnostics
+    GsxMethod('InitiateIOSDiagnostic', 'glob:', response='initiateResponseData'),
+    GsxMethod('FetchDiagnosticDetails', 'glob:', 'FetchDiagnosticDetailsRequestData',
+              'diagnosticDetailsResponseData'),
+    GsxMethod('FetchDiagnosticSuites', 'glob:', 'FetchDiagnosticSuitesRequestData',
+              'diagnosticSuitesResponseData'),
+    GsxMethod('FetchDiagnosticConsoleURL', 'glob:', response='fetchDCURLResponseData'),
+    GsxMethod('FetchDiagnosticEventNumbers', 'glob:', response='diagnosticEventNumbers'),
+    GsxMethod('RunDiagnosticTest', 'glob:', 'RunDiagnosticTestRequestData',
+              'diagnosticTestResponseData'),
+    # Communications
+    GsxMethod('FetchCommunicationContent', 'glob:', response='communicationMessage'),
+    GsxMethod('FetchCommunicationArticles', 'glob:', response='communicationMessage'),
+    GsxMethod('AcknowledgeCommunication', 'glob:', response='communicationResponse'),
+    # Escalations
+    GsxMethod('CreateGeneralEscalation', 'asp:', response='escalationConfirmation'),
+    GsxMethod('UpdateGeneralEscalation', 'asp:', response='escalationConfirmation'),
+    GsxMethod('GeneralEscalationDetailsLookup', 'asp:', response='lookupResponseData'),
+    # Lookups
+    GsxMethod('PartsLookup', 'core:', response='parts'),
+    GsxMethod('RepairLookup', 'asp:', response='lookupResponseData'),
+    GsxMethod('InvoiceIDLookup', 'asp:', response='lookupResponseData'),
+    GsxMethod('InvoiceDetailsLookup', 'asp:', response='lookupResponseData'),
+    GsxMethod('ComponentCheck', 'asp:', response='componentCheckDetails'),
+    # Orders
+    GsxMethod('CreateStockingOrder', 'asp:', response='orderConfirmation',
+              required=('purchaseOrderNumber', 'orderLines')),
+    # Repairs
+    GsxMethod('ReportedSymptomIssue', 'asp:', response='ReportedSymptomIssueResponse'),
+    GsxMethod('UpdateSerialNumber', 'asp:', response='repairConfirmation',
+              required=('repairConfirmationNumber', 'partInfo')),
+    GsxMethod('UpdateKGBSerialNumber', 'asp:', response='UpdateKGBSerialNumberResponse',
+              required=('repairConfirmationNumber', 'serialNumber')),
+    GsxMethod('MarkRepairComplete', 'asp:', response='MarkRepairCompleteResponse',
+              required=('repairConfirmationNumbers',)),
+    GsxMethod('RepairStatus', 'asp:', response='repairStatus',
+              required=('repairConfirmationNumbers',)),
+    GsxMethod('RepairDetails', 'core:', response='lookupResponseData'),
+    GsxMethod('CreateCarryIn', 'emea:', response='repairConfirmation',
+              required=(UNIT, 'shipTo', 'customerAddress')),
+    GsxMethod('UpdateCarryIn', 'asp:', response='repairConfirmation',
+              required=('repairConfirmationNumber',)),
+    GsxMethod('CreateIndirectOnsiteRepair', 'asp:', response='repairConfirmation',
+              required=(UNIT, 'shippingLocation', 'customerAddress'),
+              aliases=ONSITE_ALIASES),
+    GsxMethod('CreateRepairOrReplace', 'asp:', response='repairConfirmation',
+              required=(UNIT, 'customerAddress')),
+    GsxMethod('CreateWholeUnitExchange', 'asp:', response='repairConfirmation',
+              required=(UNIT, 'shipTo', 'customerAddress')),
+    GsxMethod('CreateMailInRepair', 'asp:', response='repairConfirmation',
+              required=(UNIT, 'shipTo', 'customerAddress')),
+    GsxMethod('depotShipperLabelRequest', 'asp:', 'depotShipperLabelRequest',
+              'depotShipperLabelResponse'),
+    # Returns
+    GsxMethod('PartsPendingReturn', 'asp:', response='partsPendingResponse'),
+    GsxMethod('ReturnReport', 'asp:', response='returnResponseData'),
+    GsxMethod('ReturnLabel', 'asp:', response='returnLabelData'),
+    GsxMethod('RegisterPartsForBulkReturn', 'asp:', response='bulkPartsRegistrationData'),
+    GsxMethod('PartsReturnUpdate', 'asp:', response='PartsReturnUpdateResponse'),
+))
+
+
+_unregistered = {}
+
+
+def get(name, namespace):
+    """
+    Returns the GsxMethod called name. Methods missing from the
+    registry are described with the usual GSX naming conventions
+    in the given namespace and cached for subsequent calls.
+    """
+    try:
+        return METHODS[name]
+    except KeyError:
+        pass
+
+    try:
+        return _unregistered[(name, namespace)]
+    except KeyError:
+        request = name if name.endswith('Request') else ''
+        method = GsxMethod(name, namespace, request)
+        _unregistered[(name, namespace)] = method
+        return method
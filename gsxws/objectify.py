@@ -2,16 +2,23 @@
 
 import os
 import re
+import sys
+import mmap
 import base64
+import hashlib
 import tempfile
+import threading
 
-from lxml import objectify
-from datetime import datetime
+from lxml import etree, objectify
+from functools import lru_cache
+from datetime import date, datetime, timedelta
 
 DATETIME_TYPES  = ('dispatchSentDate',)
 STRING_TYPES    = ('alternateDeviceId', 'imeiNumber',)
-BASE64_TYPES    = ('packingList', 'proformaFileData', 'returnLabelFileData',)
+BASE64_TYPES    = ('packingList', 'proformaFileData', 'returnLabelFileData', 'invoiceData',)
 FLOAT_TYPES     = ('totalFromOrder', 'exchangePrice', 'stockPrice', 'netPrice',)
+INT_TYPES       = ('suiteId', 'reportedSymptomCode', 'daysRemaining', 'orderLineNumber',
+                   'quantity', 'escalationId',)
 DIAGS_TIMESTAMP_TYPES = ('startTimeStamp', 'endTimeStamp',)
 
 TZMAP = {
@@ -46,15 +53,53 @@ TZMAP = {
 }
 
 
+# The same dates repeat a lot within a response
+DATE_CACHE_SIZE = 1024
+
+MONTHS = dict((m, i + 1) for i, m in enumerate((
+    'JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN',
+    'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC',
+)))
+
+
+def _year(yy):
+    # Two-digit years work like strptime's %y
+    return yy + (1900 if yy >= 69 else 2000)
+
+
+def _hour(hh, pm=False):
+    # 12-hour clock like strptime's %I (and %p)
+    if not 1 <= hh <= 12:
+        raise ValueError('hour out of range: %d' % hh)
+    return (hh % 12) + (12 if pm else 0)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
 def gsx_date(value):
+    """
+    >>> gsx_date('08/25/10'), gsx_date('2010-08-25'), gsx_date('blaa')
+    (datetime.date(2010, 8, 25), datetime.date(2010, 8, 25), None)
+    """
     try:
         # standard GSX format: "mm/dd/yy"
+        if len(value) == 8 and value[2] == value[5] == '/':
+            m, d, y = value[0:2], value[3:5], value[6:8]
+            if (m + d + y).isdigit():
+                return date(_year(int(y)), int(m), int(d))
+        # some dates are formatted as "yyyy-mm-dd"
+        if len(value) == 10 and value[4] == value[7] == '-':
+            y, m, d = value[0:4], value[5:7], value[8:10]
+            if (y + m + d).isdigit():
+                return date(int(y), int(m), int(d))
+    except (ValueError, TypeError):
+        return
+
+    try:
         return datetime.strptime(value, "%m/%d/%y").date()
     except ValueError:
         pass
 
     try:
-        # some dates are formatted as "yyyy-mm-dd"
         return datetime.strptime(value, "%Y-%m-%d").date()
     except (ValueError, TypeError):
         pass
@@ -69,38 +114,286 @@ def gsx_price(value):
     return float(re.sub(r'[A-Z ,]', '', value))
 
 
+# Where decoded attachments are stored
+SPOOL_DIR = os.getenv('GSX_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'gsxws'))
+
+
+class GsxAttachment(object):
+    """
+    A base64-encoded file in a GSX response (return label, packing list...)
+
+    Nothing is decoded until the contents are used. The decoded file
+    is stored in SPOOL_DIR under the hash of its contents, so the same
+    attachment is only ever written to disk once, however many times
+    it's read. Remove old files with cleanup().
+
+    >>> a = GsxAttachment(base64.b64encode(b'%PDF-1.4').decode())
+    >>> a.bytes
+    b'%PDF-1.4'
+    >>> a.path == GsxAttachment(a.encoded).path
+    True
+    """
+    __slots__ = ('encoded', 'suffix', '_bytes', '_path',)
+
+    def __init__(self, encoded, suffix='.pdf'):
+        self.encoded = encoded
+        self.suffix = suffix
+        self._bytes = None
+        self._path = None
+
+    @property
+    def bytes(self):
+        if self._bytes is None:
+            self._bytes = base64.b64decode(self.encoded)
+        return self._bytes
+
+    @property
+    def path(self):
+        if self._path is None:
+            data = self.bytes
+            path = os.path.join(SPOOL_DIR, hashlib.sha256(data).hexdigest() + self.suffix)
+
+            try:
+                os.utime(path)  # keep it from being cleaned up
+            except FileNotFoundError:
+                # Not written yet, or cleaned up since
+                os.makedirs(SPOOL_DIR, mode=0o700, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=SPOOL_DIR)
+                with os.fdopen(fd, 'wb') as fp:
+                    fp.write(data)
+                os.replace(tmp, path)
+
+            self._path = path
+
+        return self._path
+
+    def mmap(self):
+        """Returns a read-only memory map of the decoded file."""
+        with open(self.path, 'rb') as fp:
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __fspath__(self):
+        return self.path
+
+    def __str__(self):
+        return self.path
+
+    def __repr__(self):
+        return '<GsxAttachment %d bytes>' % (len(self.encoded) * 3 // 4)
+
+
+def cleanup(max_age=timedelta(days=1)):
+    """
+    Removes the decoded attachments that haven't been used
+    in max_age and returns the number of bytes reclaimed.
+    """
+    reclaimed = 0
+    cutoff = datetime.now() - max_age
+
+    try:
+        names = os.listdir(SPOOL_DIR)
+    except FileNotFoundError:
+        return reclaimed
+
+    for name in names:
+        path = os.path.join(SPOOL_DIR, name)
+        try:
+            st = os.stat(path)
+            if datetime.fromtimestamp(st.st_mtime) < cutoff:
+                os.remove(path)
+                reclaimed += st.st_size
+        except OSError:
+            pass
+
+    return reclaimed
+
+
 def gsx_attachment(value):
-    v = base64.b64decode(value)
-    of = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
-    of.write(v)
-    return of.name
+    return GsxAttachment(value)
 
 
+@lru_cache(maxsize=DATE_CACHE_SIZE)
 def gsx_datetime(value):
+    """
+    >>> gsx_datetime('2011-01-27 11:45:01 PST')
+    datetime.datetime(2011, 1, 27, 11, 45, 1)
+    """
     # 2011-01-27 11:45:01 PST
     # Unfortunately we have to chomp off the TZ info...
+    if (len(value) > 20 and value[4] == value[7] == '-' and value[10] == ' '
+            and value[13] == value[16] == ':' and value[19] == ' '):
+        y, mo, d = value[0:4], value[5:7], value[8:10]
+        h, mi, sec = value[11:13], value[14:16], value[17:19]
+        if (y + mo + d + h + mi + sec).isdigit() and value[20:].isalnum():
+            return datetime(int(y), int(mo), int(d), int(h), int(mi), int(sec))
+
     m = re.search(r'^(\d+\-\d+\-\d+ \d+:\d+:\d+) (\w+)$', value)
     ts, tz = m.groups()
     return datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
 
 
+@lru_cache(maxsize=DATE_CACHE_SIZE)
 def gsx_timestamp(value):
+    """
+    >>> gsx_timestamp('03/06/14 09:01 PM')
+    datetime.datetime(2014, 3, 6, 21, 1)
+    """
     # 03/06/14 09:01 PM
+    if (len(value) == 17 and value[2] == value[5] == '/' and value[8] == ' '
+            and value[11] == ':' and value[14] == ' '):
+        m, d, y, h, mi = value[0:2], value[3:5], value[6:8], value[9:11], value[12:14]
+        p = value[15:17].upper()
+        if (m + d + y + h + mi).isdigit() and p in ('AM', 'PM'):
+            return datetime(_year(int(y)), int(m), int(d),
+                            _hour(int(h), p == 'PM'), int(mi))
+
     return datetime.strptime(value, "%m/%d/%y %I:%M %p")
 
 
+@lru_cache(maxsize=DATE_CACHE_SIZE)
 def gsx_diags_timestamp(value):
+    """
+    >>> gsx_diags_timestamp('05-Mar-14 09:01:02')
+    datetime.datetime(2014, 3, 5, 9, 1, 2)
+    """
     # It is always in GMT and in format DD-MMM-YY HH24:MM:SS
+    if (len(value) == 18 and value[2] == value[6] == '-' and value[9] == ' '
+            and value[12] == value[15] == ':'):
+        d, mon, y = value[0:2], MONTHS.get(value[3:6].upper()), value[7:9]
+        h, mi, sec = value[10:12], value[13:15], value[16:18]
+        if mon and (d + y + h + mi + sec).isdigit():
+            return datetime(_year(int(y)), mon, int(d), _hour(int(h)), int(mi), int(sec))
+
     return datetime.strptime(value, "%d-%b-%y %I:%M:%S")
 
 
+def convert_column(tag, values):
+    """
+    Converts the texts of many tag elements at once (such as
+    the same field of every repair in a lookup), converting
+    each distinct text only once.
+
+    >>> convert_column('repairDate', ['08/25/10', '08/25/10', ''])
+    [datetime.date(2010, 8, 25), datetime.date(2010, 8, 25), None]
+    """
+    converted = {}
+
+    for text in set(values):
+        converted[text] = convert(tag, text)
+
+    return [converted[text] for text in values]
+
+
+# How the values of the different elements are converted.
+# Elements not listed here are typed by the suffix of their name
+# or, failing that, left as strings (see GsxElement).
+# One map serves every response: GSX names its elements the same
+# way in all of them (a daysRemaining is always a day count, a
+# zipCode always a code), so a tag never needs a different type
+# depending on the response it came in.
+FIELD_TYPES = dict(
+    [(t, str) for t in STRING_TYPES] +
+    [(t, int) for t in INT_TYPES] +
+    [(t, gsx_datetime) for t in DATETIME_TYPES] +
+    [(t, gsx_diags_timestamp) for t in DIAGS_TIMESTAMP_TYPES] +
+    [(t, gsx_attachment) for t in BASE64_TYPES] +
+    [(t, gsx_price) for t in FLOAT_TYPES]
+)
+
+SUFFIX_TYPES = (
+    ('Date', gsx_date),
+    ('Timestamp', gsx_timestamp),
+)
+
+BOOLEANS = ('Y', 'N', 'true', 'false',)
+
+_field_types = {}
+
+
+def field_type(tag):
+    """Returns the converter for the value of element tag (or None)."""
+    try:
+        return _field_types[tag]
+    except KeyError:
+        pass
+
+    result = FIELD_TYPES.get(tag)
+
+    if result is None:
+        for suffix, t in SUFFIX_TYPES:
+            if tag.endswith(suffix):
+                result = t
+                break
+
+    _field_types[tag] = result
+    return result
+
+
+def convert(tag, text):
+    """
+    Converts the text of a leaf element to a Python value.
+
+    >>> convert('zipCode', '01234'), convert('partCovered', 'Y'), convert('notes', '')
+    ('01234', True, None)
+    """
+    to_python = field_type(tag)
+
+    if to_python is str:
+        return text or ''
+
+    if not text:
+        return
+
+    if to_python is not None:
+        return to_python(text)
+
+    if text in BOOLEANS:
+        return gsx_boolean(text)
+
+    return text
+
+
+# Converted values by (tag, text). lxml hands out a new proxy object
+# for the same element from one access to the next, so values can't be
+# stored on the elements themselves - equal text converts equally anyway.
+MEMO_SIZE = 4096
+UNCACHED_TYPES = (gsx_attachment,)
+
+_memo = {}
+
+
+def value(tag, text):
+    """Returns the converted value of a leaf, from the memo if possible."""
+    key = (tag, text)
+    try:
+        return _memo[key]
+    except KeyError:
+        pass
+
+    result = convert(tag, text)
+
+    if field_type(tag) not in UNCACHED_TYPES:
+        if len(_memo) >= MEMO_SIZE:
+            _memo.clear()
+        _memo[key] = result
+
+    return result
+
+
+_lookup = objectify.ObjectifiedElement.__getattribute__
+_text = objectify.ObjectifiedElement.text.__get__
+_countchildren = objectify.ObjectifiedElement.countchildren
+
+
 class GsxElement(objectify.ObjectifiedElement):
     """
-    Each element in the GSX response tree should be a GsxElement
+    Each element in the GSX response tree should be a GsxElement.
+    The tree is parsed without objectify's type inference, leaf values
+    are converted on access according to FIELD_TYPES and SUFFIX_TYPES.
     """
     def __getattribute__(self, name):
         try:
-            result = super(GsxElement, self).__getattribute__(name)
+            result = _lookup(self, name)
         except AttributeError:
             """
             The XML returned by GSX can be pretty inconsistent, especially
@@ -110,41 +403,192 @@ class GsxElement(objectify.ObjectifiedElement):
             """
             return
 
-        # Work around lxml chomping leading zeros off of IMEI numbers
-        if name in STRING_TYPES:
-            return str(result.text or '')
+        if type(result) is not GsxElement:
+            return result
+
+        # Going around our own __getattribute__ for the child
+        text = _text(result)
+
+        if text is None:
+            return result if _countchildren(result) else convert(name, text)
+
+        return value(name, text)
+
+
+# Strings up to this long are interned when materialized
+INTERN_SIZE = 128
+
+_tag = objectify.ObjectifiedElement.tag.__get__
+_iterchildren = objectify.ObjectifiedElement.iterchildren
+_shapes = {}
+
+
+def _shape(fields):
+    """
+    Returns the shared copy of the field names fields and a dict
+    mapping each name to its position, one of each per shape.
+    """
+    try:
+        return _shapes[fields]
+    except KeyError:
+        shape = _shapes[fields] = (fields, dict((k, i) for i, k in enumerate(fields)))
+        return shape
+
+
+class GsxRecord(object):
+    """
+    A response element copied out of the parsed tree (see materialize()).
+    Children are read as attributes like with GsxElement, repeated
+    children come back as lists. Records don't keep the tree alive
+    and pickle cheaply.
+    """
+    __slots__ = ('tag', '_fields', '_index', '_values',)
+
+    def __init__(self, tag, fields, values):
+        self.tag = tag
+        self._fields, self._index = _shape(fields)
+        self._values = values
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        try:
+            return self._values[self._index[name]]
+        except KeyError:
+            return  # Missing fields are None, just like with GsxElement
+
+    # A single record behaves like a single GsxElement - a sequence of one
+    def __iter__(self):
+        yield self
+
+    def __len__(self):
+        return 1
+
+    def __getitem__(self, index):
+        if index not in (0, -1):
+            raise IndexError(index)
+        return self
+
+    def __reduce__(self):
+        return (GsxRecord, (self.tag, self._fields, self._values,))
 
-        if isinstance(result, objectify.NumberElement):
-            return result.pyval
+    def __repr__(self):
+        return '<GsxRecord %s>' % self.tag
 
-        if isinstance(result, objectify.StringElement):
-            name = result.tag
-            result = result.text or ''
-            result = str(result)
+    def as_dict(self):
+        """Returns this record (and its children) as plain dicts."""
+        def plain(v):
+            if isinstance(v, GsxRecord):
+                return v.as_dict()
+            if isinstance(v, list):
+                return [plain(i) for i in v]
+            return v
 
-            if not result:
-                return
+        return dict((k, plain(v)) for k, v in zip(self._fields, self._values))
 
-            if name in DATETIME_TYPES:
-                return gsx_datetime(result)
-            if name in DIAGS_TIMESTAMP_TYPES:
-                return gsx_diags_timestamp(result)
-            if name in BASE64_TYPES:
-                return gsx_attachment(result)
-            if name in FLOAT_TYPES:
-                return gsx_price(result)
-            if name.endswith('Date'):
-                return gsx_date(result)
-            if name.endswith('Timestamp'):
-                return gsx_timestamp(result)
-            if re.search(r'^[YN]$', result):
-                return gsx_boolean(result)
 
-        return result
+def _record(el):
+    data, repeated = {}, set()
+
+    for child in _iterchildren(el, tag=etree.Element):
+        tag = sys.intern(_tag(child))
+        text = _text(child)
+
+        if text is None and _countchildren(child):
+            v = _record(child)
+        else:
+            v = value(tag, text) if text is not None else convert(tag, text)
+            if isinstance(v, str) and len(v) <= INTERN_SIZE:
+                v = sys.intern(v)
+
+        if tag in repeated:
+            data[tag].append(v)
+        elif tag in data:
+            data[tag] = [data[tag], v]
+            repeated.add(tag)
+        else:
+            data[tag] = v
+
+    return GsxRecord(sys.intern(_tag(el)), tuple(data), tuple(data.values()))
+
+
+def materialize(el):
+    """
+    Copies el (and its siblings with the same tag) out of the parsed
+    tree into GsxRecords, converting every value once. Returns a record,
+    or a list of them if there are several. The tree can be dropped
+    right after.
+
+    >>> r = materialize(parse('tests/fixtures/parts_lookup.xml', 'PartsLookupResponse'))
+    >>> len(r.parts), r.parts[0].exchangePrice
+    (3, 14.4)
+    """
+    if el is None:
+        return
+
+    records = [_record(e) for e in el]
+    return records[0] if len(records) == 1 else records
+
+
+_local = threading.local()
+_paths = {}
+_is_xml = re.compile(r'\s*<').match
+
+
+def get_parser():
+    """Returns the parser of this thread, creating it on first use."""
+    try:
+        return _local.parser
+    except AttributeError:
+        parser = etree.XMLParser(remove_blank_text=True)
+        # Every element is a GsxElement - no type guessing
+        parser.set_element_class_lookup(etree.ElementDefaultClassLookup(element=GsxElement))
+        _local.parser = parser
+        return parser
+
+
+def find(root, response):
+    """
+    Returns the response element of root. The result normally sits at
+    Envelope/Body/ns:MethodResponse/MethodResponse/response (or is the
+    inner MethodResponse itself) so look there first and only search
+    the whole tree if it's somewhere else.
+    """
+    try:
+        path = _paths[response]
+    except KeyError:
+        path = etree.XPath('(/*/*/*/*/{0} | /*/*/*/{0})[1]'.format(response))
+        _paths[response] = path
+
+    result = path(root)
+    if result:
+        return result[0]
+
+    return root.find('*//%s' % response)
+
+
+def parse_file(path, response):
+    return find(etree.parse(path, get_parser()), response)
+
+
+def parse_bytes(data, response):
+    return find(etree.fromstring(data, get_parser()), response)
+
+
+def parse_records(data, response):
+    """
+    Parses XML bytes and materializes the response element in one go.
+    Meant to run in a worker process: only bytes go in and only
+    picklable GsxRecords come out.
+    """
+    return materialize(parse_bytes(data, response))
 
 
 def parse(root, response):
     """
+    Parses a GSX response given as XML (bytes or str) or a path
+    to a file and returns the response element.
+
     >>> parse('tests/fixtures/warranty_status.xml', 'warrantyDetailInfo').warrantyStatus
     'Apple Limited Warranty'
     >>> parse('tests/fixtures/warranty_status.xml', 'warrantyDetailInfo').estimatedPurchaseDate
@@ -153,16 +597,49 @@ def parse(root, response):
     True
     >>> parse('tests/fixtures/warranty_status.xml', 'warrantyDetailInfo').isPersonalized
     """
-    parser = objectify.makeparser(remove_blank_text=True)
-    lookup = objectify.ObjectifyElementClassLookup(tree_class=GsxElement)
-    parser.set_element_class_lookup(lookup)
+    if isinstance(root, str):
+        if not _is_xml(root):
+            return parse_file(root, response)
+        root = root.encode('utf-8')
 
-    if isinstance(root, str) and os.path.exists(root):
-        root = objectify.parse(root, parser)
-    else:
-        root = objectify.fromstring(root, parser)
+    return parse_bytes(root, response)
 
-    return root.find('*//%s' % response)
+
+# Going around GsxElement.__getattribute__ while cleaning up
+_getparent = objectify.ObjectifiedElement.getparent
+_getprevious = objectify.ObjectifiedElement.getprevious
+_iterancestors = objectify.ObjectifiedElement.iterancestors
+_clear = objectify.ObjectifiedElement.clear
+_remove = objectify.ObjectifiedElement.remove
+
+
+def iterparse(source, response):
+    """
+    Parses a GSX response (a file object or a path to a file)
+    incrementally and yields every response element as a GsxRecord
+    as soon as it has been read. The elements are dropped right
+    after so only one result is held in memory at a time.
+
+    >>> [p.partNumber for p in iterparse('tests/fixtures/parts_lookup.xml', 'parts')]
+    ['661-4448', '661-4954', '661-5028']
+    """
+    context = etree.iterparse(source, events=('end',), tag=response,
+                              remove_blank_text=True)
+    context.set_element_class_lookup(etree.ElementDefaultClassLookup(element=GsxElement))
+
+    for _, el in context:
+        # Nested elements are part of the outer result
+        for _ in _iterancestors(el, response):
+            break
+        else:
+            yield _record(el)
+            _clear(el, keep_tail=True)
+            parent, previous = _getparent(el), _getprevious(el)
+            while previous is not None:
+                _remove(parent, previous)
+                previous = _getprevious(el)
+
+    del context
 
 
 if __name__ == '__main__':
@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from .core import GsxObject
+from .core import GsxObject, GsxStruct
 
 
-class OrderLine(GsxObject):
-    partNumber = None
-    quantity = None
+class OrderLine(GsxStruct):
+    partNumber: str = None
+    quantity: int = None
 
 
 class APPOrder(GsxObject):
@@ -4,23 +4,98 @@ https://gsxwsut.apple.com/apidocs/ut/html/WSAPIChangeLog.html?user=asp
 """
 
 import re
+import bisect
 
+from . import snapshot
 from .utils import fetch_url
 from .lookups import Lookup
 from .diagnostics import Diagnostics
 from .core import GsxObject, GsxError, validate
 
 
+class ProductIndex(object):
+    """
+    The product families and models of products.yaml, indexed
+    for lookups by family, exact model name, name prefix and
+    substring. Prefix and substring searches ignore case.
+
+    >>> index().family_of('Apple TV 4K')
+    'APPLETV'
+    >>> index().startswith('apple tv (')
+    ['Apple TV (2nd generation)', 'Apple TV (3rd generation)', 'Apple TV (4th generation)']
+    """
+    def __init__(self, families):
+        self._families = families
+        self._family_of = dict((m, k) for k, v in families.items() for m in v['models'])
+        self._names = sorted(self._family_of, key=str.lower)
+        self._keys = [n.lower() for n in self._names]
+
+    def family(self, code):
+        """Returns the name and models of the family with the code (IMAC, IPAD...)."""
+        return self._families.get(code)
+
+    def family_of(self, model):
+        """Returns the family code of the model with this exact name."""
+        return self._family_of.get(model)
+
+    def models(self, code=None):
+        """Returns the models of the family with the code, or all models."""
+        if code is None:
+            return list(self._names)
+        try:
+            return list(self._families[code]['models'])
+        except KeyError:
+            return []
+
+    def startswith(self, prefix):
+        """Returns the models whose name starts with prefix."""
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + '\uffff', start)
+        return self._names[start:end]
+
+    def search(self, text):
+        """Returns the models with text anywhere in their name."""
+        text = text.lower()
+        return [n for n, k in zip(self._names, self._keys) if text in k]
+
+    def as_dict(self):
+        """Returns a copy of the family to models map, as in products.yaml."""
+        return dict((k, {'name': v['name'], 'models': list(v['models'])})
+                    for k, v in self._families.items())
+
+
+_index = None
+
+
+def index():
+    """
+    Returns the product index, which is loaded once
+    (from the snapshot, if there is one).
+    """
+    global _index
+
+    if _index is None:
+        snap = snapshot.load()
+        if snap is not None:
+            families = snap.models()
+        else:
+            import os
+            import yaml
+            filepath = os.path.join(os.path.dirname(__file__), "products.yaml")
+            with open(filepath, 'r') as f:
+                families = yaml.safe_load(f)
+        _index = ProductIndex(families)
+
+    return _index
+
+
 def models():
     """
     >>> models() # doctest: +ELLIPSIS
-    {'IPODCLASSIC': {'models': ['iPod 5th Generation (Late 2006)', ...
+    {'APPLETV': {'name': 'Apple TV', 'models': ['Apple TV', 'Apple TV (2nd generation)', ...
     """
-    import os
-    import yaml
-    filepath = os.path.join(os.path.dirname(__file__), "products.yaml")
-    with open(filepath, 'r') as f:
-        return yaml.load(f)
+    return index().as_dict()
 
 
 class Product(object):
@@ -53,13 +128,14 @@ class Product(object):
         self.configCode = result.configCode
         return result
 
-    def warranty(self, parts=[], date_received=None, ship_to=None):
+    def warranty(self, parts=[], date_received=None, ship_to=None, materialize=False):
         """
         The Warranty Status API retrieves the same warranty details
         displayed on the GSX Coverage screen.
         If part information is provided, the part warranty information is returned.
         If you do not provide the optional part information in the
         warranty status request, the unit level warranty information is returned.
+        With materialize=True the details are returned as a GsxRecord.
 
         >>> Product('DGKFL06JDHJP').warranty().warrantyStatus
         'Out Of Warranty (No Coverage)'
@@ -92,7 +168,8 @@ class Product(object):
         if date_received is not None:
             self._gsx.unitReceivedDate = date_received
 
-        self._gsx._submit("unitDetail", "WarrantyStatus", "warrantyDetailInfo")
+        self._gsx._submit("unitDetail", "WarrantyStatus", "warrantyDetailInfo",
+                          materialize=materialize)
 
         self.warrantyDetails = self._gsx._req.objects
         self.imageURL = self.warrantyDetails.imageURL
@@ -4,7 +4,7 @@
 import sys
 import logging
 
-from .core import GsxObject, GsxError, validate
+from .core import GsxBase, GsxObject, GsxStruct, GsxError, validate
 from .lookups import Lookup
 
 REPAIR_TYPES = (
@@ -75,44 +75,57 @@ class SymptomIssue(GsxObject):
         return result
 
 
-class CompTiaCode(GsxObject):
+class CompTiaCode(GsxStruct):
     """
     Data type used to provide comptia codes
     """
-    comptiaCode = ""
-    comptiaModifier = ""
-    comptiaGroup = ""
-    technicianNote = ""
+    comptiaCode: str = ""
+    comptiaModifier: str = ""
+    comptiaGroup: str = ""
+    technicianNote: str = ""
 
 
-class Customer(GsxObject):
+class Customer(GsxStruct):
     """
     Customer address for GSX
 
     >>> Customer(adressLine1='blaa')._data
     {'adressLine1': 'blaa'}
     """
-    city = ""
-    region = ""
-    country = ""
-    state = "ZZ"
-    zipCode = ""
-    lastName = ""
-    firstName = ""
-    adressLine1 = ""
-    emailAddress = ""
-    primaryPhone = ""
-
-
-class RepairOrderLine(GsxObject):
-    partNumber = ""
-    comptiaCode = ""
-    comptiaModifier = ""
-
-
-class ComponentCheck(GsxObject):
-    component = ""
-    serialNumber = ""
+    firstName: str = ""
+    lastName: str = ""
+    companyName: str
+    addressLine1: str
+    adressLine1: str = ""
+    addressLine2: str
+    street: str
+    city: str = ""
+    region: str = ""
+    regionCode: str
+    country: str = ""
+    state: str = "ZZ"
+    zipCode: str = ""
+    emailAddress: str = ""
+    primaryPhone: str = ""
+    secondaryPhone: str
+
+
+class RepairOrderLine(GsxStruct):
+    partNumber: str = ""
+    comptiaCode: str = ""
+    comptiaModifier: str = ""
+    abused: bool
+    outOfWarrantyFlag: bool
+    coveredByACPlus: bool
+    diagnosticCode: str
+    orderNumber: str
+    returnOrderNumber: str
+    returnType: int
+
+
+class ComponentCheck(GsxStruct):
+    component: str = ""
+    serialNumber: str = ""
 
 
 class ServicePart(GsxObject):
@@ -127,13 +140,50 @@ class ServicePart(GsxObject):
 
 
 class Repair(GsxObject):
-    "Base class for the different GSX Repair types"
+    """
+    Base class for the different GSX Repair types.
+    Keeps track of the fields that have been set since the repair
+    was last created or updated so that updates only send those.
+    Nested values (lists and objects) that may have been changed
+    in place are compared with how they looked at the time.
+
+    >>> r = CarryInRepair('G135773004', statusCode='BEGR')
+    >>> r.mark_clean()
+    >>> r.technicianId = '123'
+    >>> r.changed
+    ['technicianId']
+    """
     def __init__(self, number=None, **kwargs):
         self._namespace = "asp:"
+        self._changed = set()
+        self._clean = {}
         super(Repair, self).__init__(**kwargs)
         if number is not None:
             self.dispatchId = number
 
+    def __setattr__(self, name, value):
+        super(Repair, self).__setattr__(name, value)
+        if not name.startswith("_"):
+            self._changed.add(name)
+
+    def _serialize(self, k):
+        chunks = []
+        self.write_children(chunks.append, {k: self._data[k]})
+        return b''.join(chunks)
+
+    def _nested(self):
+        return [k for k, v in self._data.items() if isinstance(v, (list, GsxBase))]
+
+    @property
+    def changed(self):
+        "Names of the fields set or modified since the last create or update"
+        return [k for k in self._data if k in self._changed or
+                (k in self._clean and self._clean[k] != self._serialize(k))]
+
+    def mark_clean(self):
+        self._changed.clear()
+        self._clean = dict((k, self._serialize(k)) for k in self._nested())
+
     def update_sn(self, parts):
         """
         Description
@@ -284,6 +334,7 @@ class CarryInRepair(Repair):
             if hasattr(result.repairConfirmation, 'messages'):
                 raise GsxError(result.repairConfirmation.messages)
 
+        self.mark_clean()
         self.dispatchId = result.confirmationNumber
         return result
 
@@ -302,9 +353,21 @@ class CarryInRepair(Repair):
             self.repairConfirmationNumber = self.dispatchId
             del self._data['dispatchId']
 
-        # Merge old and new data (old data should have Dispatch ID)
-        self._data.update(newdata)
-        return self._submit("repairData", "UpdateCarryIn", "repairConfirmation")
+        for k, v in newdata.items():
+            setattr(self, k, v)
+
+        # Only send what has changed since the last create/update
+        delta = GsxObject(repairConfirmationNumber=self.repairConfirmationNumber)
+        delta._namespace = self._namespace
+
+        for k in self.changed:
+            if k != "repairConfirmationNumber":
+                delta._data[k] = self._data[k]
+
+        result = delta._submit("repairData", "UpdateCarryIn", "repairConfirmation")
+        self._req = delta._req
+        self.mark_clean()
+        return result
 
     def set_techid(self, new_techid):
         return self.update({'technicianId': new_techid})
@@ -322,23 +385,8 @@ class IndirectOnsiteRepair(Repair):
     which is a reference number to identify the repair.
     """
     def create(self):
+        # Carry-In field names (shipTo etc) are renamed by the method spec
         self._namespace = "asp:"
-        if hasattr(self, "shipTo"):  # Carry-In and OnSite use different field names!
-            self.shippingLocation = self.shipTo
-            del(self._data['shipTo'])
-
-        if hasattr(self, "poNumber"):
-            self.purchaseOrderNumber = self.poNumber
-            del(self._data['poNumber'])
-
-        if hasattr(self, "diagnosedByTechId"):
-            self.technicianName = self.diagnosedByTechId
-            del(self._data['diagnosedByTechId'])
-
-        if hasattr(self, "requestReviewByApple"):
-            self.requestReview = self.requestReviewByApple
-            del(self._data['requestReviewByApple'])
-
         return self._submit("repairData", "CreateIndirectOnsiteRepair",
                             "repairConfirmation")
 
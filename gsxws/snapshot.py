@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Compiles the static reference data (locale formats, product models
+and CompTIA codes) into a single snapshot file that is mmap'ed
+read-only, so that preforked workers share the same pages.
+
+Build the snapshot once, e.g. at deploy time:
+
+    python -m gsxws.snapshot [path] [--user_id ID --sold_to NUMBER]
+
+By default the snapshot is kept next to this module, which is often
+read-only in an installed package - set GSX_SNAPSHOT to the path
+of the snapshot to build and load it somewhere else:
+
+    GSX_SNAPSHOT=/var/cache/gsxws/reference.snap python -m gsxws.snapshot
+
+The file starts with a small JSON index mapping section and key to
+an (offset, length) pair. Values are JSON-encoded and only decoded
+when they're looked up.
+"""
+
+import os
+import json
+import mmap
+import struct
+import logging
+
+MAGIC = b'GSXSNAP1'
+HEADER = struct.Struct('<I')
+
+SNAPSHOT_PATH = os.getenv('GSX_SNAPSHOT',
+                          os.path.join(os.path.dirname(__file__), 'reference.snap'))
+
+_snapshot = None  # False once SNAPSHOT_PATH has been found missing
+
+
+def build(path=None, comptia=None):
+    """
+    Compiles langs.json, products.yaml and the given CompTIA codes
+    (as returned by comptia.fetch()) into a snapshot at path.
+    """
+    import yaml
+    global _snapshot
+    path = path or SNAPSHOT_PATH
+    here = os.path.dirname(__file__)
+
+    with open(os.path.join(here, 'langs.json'), 'r') as fp:
+        langs = json.load(fp)
+
+    with open(os.path.join(here, 'products.yaml'), 'r') as fp:
+        products = yaml.safe_load(fp)
+
+    sections = {
+        'langs': langs,
+        'products': products,
+        'models': dict((m, k) for k, v in products.items() for m in v['models']),
+        'comptia': comptia or {},
+    }
+
+    index, data = {}, bytearray()
+
+    for section, values in sections.items():
+        index[section] = {}
+        for k, v in values.items():
+            v = json.dumps(v, separators=(',', ':')).encode('utf-8')
+            index[section][k] = (len(data), len(v))
+            data.extend(v)
+
+    header = json.dumps(index, separators=(',', ':')).encode('utf-8')
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fp:
+        fp.write(MAGIC)
+        fp.write(HEADER.pack(len(header)))
+        fp.write(header)
+        fp.write(data)
+
+    os.replace(tmp, path)
+
+    if path == SNAPSHOT_PATH:
+        _snapshot = None  # let load() pick up the new snapshot
+
+    return path
+
+
+class Snapshot(object):
+    """Read-only view of a snapshot file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not a gsxws snapshot' % path)
+
+        start = len(MAGIC) + HEADER.size
+        size = HEADER.unpack_from(self._mm, len(MAGIC))[0]
+        self._index = json.loads(self._mm[start:start + size].decode('utf-8'))
+        self._base = start + size
+
+    def get(self, section, key, default=None):
+        try:
+            offset, size = self._index[section][key]
+        except KeyError:
+            return default
+
+        offset += self._base
+        return json.loads(self._mm[offset:offset + size].decode('utf-8'))
+
+    def keys(self, section):
+        return list(self._index.get(section, {}).keys())
+
+    def locale(self, locale):
+        """Returns the date and time formats of locale."""
+        return self.get('langs', locale)
+
+    def family(self, code):
+        """Returns the product family with the code (IMAC, IPAD...)."""
+        return self.get('products', code)
+
+    def model_family(self, model):
+        """Returns the product family code of model."""
+        return self.get('models', model)
+
+    def models(self):
+        return dict((k, self.family(k)) for k in self.keys('products'))
+
+    def comptia(self, group=None):
+        """
+        Returns the CompTIA codes of group or all of them,
+        in the same form as comptia.fetch().
+        """
+        if group is not None:
+            return [tuple(c) for c in self.get('comptia', group, [])]
+
+        return dict((g, self.comptia(g)) for g in self.keys('comptia'))
+
+    def close(self):
+        self._mm.close()
+
+
+def load(path=None):
+    """
+    Returns the snapshot at path (or SNAPSHOT_PATH), or None if
+    it hasn't been built. The default snapshot is only looked for
+    and opened once per process, so load it before forking.
+    """
+    global _snapshot
+
+    if path is not None:
+        return Snapshot(path)
+
+    if _snapshot is None:
+        _snapshot = Snapshot(SNAPSHOT_PATH) if os.path.exists(SNAPSHOT_PATH) else False
+
+    return _snapshot or None
+
+
+if __name__ == '__main__':
+    import argparse
+    from . import comptia
+    from .core import connect
+
+    parser = argparse.ArgumentParser(description="Build the gsxws reference data snapshot")
+    parser.add_argument("path", nargs="?", default=SNAPSHOT_PATH)
+    parser.add_argument("--user_id")
+    parser.add_argument("--sold_to")
+    parser.add_argument("--environment", default="ut")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG)
+    codes = None
+
+    if args.user_id:
+        connect(args.user_id, args.sold_to, args.environment)
+        codes = comptia.fetch()
+
+    print(build(args.path, codes))
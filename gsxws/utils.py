@@ -2,7 +2,6 @@
 
 import re
 import tempfile
-import requests
 
 
 def fetch_url(url):
@@ -21,6 +20,8 @@ def fetch_url(url):
     if ext not in ALLOWED:
         raise ValueError('File extension should be one of %s, not %s' % (', '.join(ALLOWED), ext))
 
+    import requests
+
     try:
         resp = requests.get(url)
     except Exception as e:
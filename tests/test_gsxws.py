@@ -1,26 +1,102 @@
 # -*- coding: utf-8 -*-
 
+import io
 import os
 import sys
+import glob
+import json
+import time
+import base64
 import logging
-from datetime import date, datetime
+import tempfile
+from datetime import date, datetime, timedelta
 
-from unittest import TestCase, main, skip
+from unittest import TestCase, main, mock, skip, skipUnless
 
 sys.path.append(os.path.abspath('..'))
 
-from gsxws.core import validate, GsxCache, connect
+from lxml import etree
+
+from gsxws import core
+from gsxws.core import validate, classify, GsxCache, GsxRequest, connect
 from gsxws.objectify import parse, gsx_diags_timestamp
 from gsxws.products import Product
 from gsxws import (repairs, escalations, lookups, returns,
                    GsxError, diagnostics, comptia, products,
-                   comms, parts,)
+                   comms, parts, orders, snapshot, objectify,)
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 
 
 def empty(a):
     return a in [None, '', ' ']
 
 
+class FakeResponse(object):
+    """Stands in for the requests response of a GSX call."""
+    def __init__(self, fixture, status_code=200, reason='OK'):
+        with open(fixture, 'rb') as fp:
+            self.content = fp.read()
+        self.text = self.content.decode('utf-8')
+        self.status_code = status_code
+        self.reason = reason
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class SessionMixin(object):
+    """Gives each test a session of its own, restoring the real one afterwards."""
+    def setUp(self):
+        super(SessionMixin, self).setUp()
+        self._session = core.GSX_SESSION
+        core.GSX_SESSION = etree.Element('userSession')
+
+    def tearDown(self):
+        core.GSX_SESSION = self._session
+        super(SessionMixin, self).tearDown()
+
+
+def make_object(data):
+    """Builds a GsxObject (with nested ones) out of the dict data."""
+    obj = core.GsxObject()
+    for k, v in data.items():
+        if isinstance(v, dict):
+            v = make_object(v)
+        if isinstance(v, list):
+            v = [make_object(i) for i in v]
+        setattr(obj, k, v)
+    return obj
+
+
+def submit(obj, arg, fixture, *args, **kwargs):
+    """Submits obj without hitting GSX, returning the result and the envelope."""
+    sent = []
+    req = GsxRequest(**{arg: obj})
+
+    def send(method, data):
+        # Large bodies are passed as files
+        sent.append(data if isinstance(data, bytes) else data.read())
+        return FakeResponse(fixture)
+
+    req._send = send
+    result = req._submit(*args, **kwargs)
+    return result, sent[0]
+
+
 class CommsTestCase(TestCase):
     def setUp(self):
         self.priority = 'HIGH'
@@ -174,6 +250,685 @@ class CoreFunctionTestCase(TestCase):
         self.assertEqual(c.get('spam'), 'eggs')
 
 
+class EnvelopeTestCase(SessionMixin, TestCase):
+    def setUp(self):
+        super(EnvelopeTestCase, self).setUp()
+        etree.SubElement(core.GSX_SESSION, 'userSessionId').text = 'abc'
+
+    def envelope(self, namespace, method, request, payload):
+        nsmap = dict(core.methods.ENVELOPE_NAMESPACES)
+        soapenv = '{%s}' % nsmap['soapenv']
+        env = etree.Element(soapenv + "Envelope", nsmap=nsmap)
+        etree.SubElement(env, soapenv + "Header")
+        body = etree.SubElement(env, soapenv + "Body")
+        method = '{%s}%s' % (nsmap[namespace.rstrip(':')], method)
+        root = etree.SubElement(etree.SubElement(body, method), request)
+        root.append(core.GSX_SESSION)
+        root.append(payload)
+        return etree.tostring(env, method='c14n')
+
+    def test_envelope(self):
+        diags = diagnostics.Diagnostics(serialNumber='DGKFL06JDHJP')
+        result, sent = submit(diags, 'diagnosticTestRequestData',
+                              'tests/fixtures/ios_diagnostics.xml',
+                              'RunDiagnosticTest', 'lookupResponseData')
+        expected = self.envelope('glob:', 'RunDiagnosticTest', 'RunDiagnosticTestRequestData',
+                                 diags.to_xml('diagnosticTestRequestData'))
+        self.assertEqual(etree.tostring(etree.fromstring(sent), method='c14n'), expected)
+
+    def test_response(self):
+        product = Product('DGKFL06JDHJP')
+        result, sent = submit(product._gsx, 'unitDetail',
+                              'tests/fixtures/warranty_status.xml', 'WarrantyStatus')
+        self.assertEqual(result.warrantyStatus, 'Apple Limited Warranty')
+
+    def test_cached_session(self):
+        env, core.GSX_ENV = core.GSX_ENV, 'ut'
+        session = core.GsxSession('user', '0001234', 'en', 'CEST')
+        session._cache.set('session_id', 'abc')
+        try:
+            el = session.login()
+            self.assertEqual(etree.tostring(el),
+                             b'<userSession><userSessionId>abc</userSessionId></userSession>')
+        finally:
+            session._cache.nuke()
+            core.GSX_ENV = env
+
+
+class SerializerTestCase(TestCase):
+    def test_fixtures(self):
+        for path in glob.glob('tests/fixtures/*.json'):
+            with open(path) as fp:
+                obj = make_object(json.load(fp))
+            expected = etree.tostring(obj.to_xml('requestData'), encoding='UTF-8')
+            self.assertEqual(obj.to_bytes('requestData'), expected, path)
+
+    def test_escaping(self):
+        obj = core.GsxObject(notes='<Ääkköset & "friends">\r\n', empty='', spices=[{'salt': 1}])
+        expected = etree.tostring(obj.to_xml('blaa'), encoding='UTF-8')
+        self.assertEqual(obj.to_bytes('blaa'), expected)
+
+
+class ClassifierTestCase(TestCase):
+    def test_precedence(self):
+        self.assertEqual(validate('A123'), 'eeeCode')
+        self.assertEqual(validate('661-5097'), 'partNumber')
+        self.assertEqual(validate('013348005376007'), 'alternateDeviceId')
+        self.assertEqual(validate('7458231326'), 'returnOrder')
+        self.assertIsNone(validate('blaa'))
+
+    def test_classify(self):
+        result = classify([' dgkfl06jdhjp', 123456789012, 'iMac (27-inch, Mid 2011)'])
+        self.assertEqual(result, [('DGKFL06JDHJP', 'serialNumber'),
+                                  ('123456789012', 'repairNumber'),
+                                  ('iMac (27-inch, Mid 2011)', 'productName')])
+
+    def test_classify_what(self):
+        result = classify(['G143111400', '661-5097'], 'dispatchId')
+        self.assertEqual([r for v, r in result], [True, False])
+
+
+class AttachmentTestCase(SessionMixin, TestCase):
+    def setUp(self):
+        super(AttachmentTestCase, self).setUp()
+        self.data = os.urandom(100000)
+        fd, self.path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(self.data)
+
+    def tearDown(self):
+        super(AttachmentTestCase, self).tearDown()
+        os.remove(self.path)
+
+    def escalation(self):
+        esc = escalations.Escalation(escalationId='1440972')
+        esc.attachment = escalations.FileAttachment(self.path)
+        return esc
+
+    def test_serialize(self):
+        esc = self.escalation()
+        expected = etree.tostring(esc.to_xml('escalationRequest'), encoding='UTF-8')
+        self.assertEqual(esc.to_bytes('escalationRequest'), expected)
+        self.assertIn(base64.b64encode(self.data), expected)
+
+    def test_file_object(self):
+        with open(self.path, 'rb') as fp:
+            obj = core.GsxObject(fileData=fp)
+            self.assertEqual(obj.fileName, self.path)
+            self.assertEqual(obj.to_bytes('a'), obj.to_bytes('a'))
+
+    def test_closed_file(self):
+        with open(self.path, 'rb') as fp:
+            obj = core.GsxObject(fileData=fp)
+        with self.assertRaisesRegex(ValueError, 'closed before the request was sent'):
+            obj.to_bytes('a')
+
+    def test_short_reads(self):
+        class Pipe(object):
+            # Returns at most 1000 bytes per read, like a pipe or a socket
+            def __init__(self, data):
+                self.data = data
+
+            def read(self, size):
+                chunk, self.data = self.data[:min(size, 1000)], self.data[min(size, 1000):]
+                return chunk
+
+        f = core.GsxFile(Pipe(self.data))
+        self.assertEqual(f.encode(), base64.b64encode(self.data).decode('ascii'))
+
+    def test_spooled_body(self):
+        size, core.GSX_SPOOL_SIZE = core.GSX_SPOOL_SIZE, 1024
+        try:
+            result, sent = submit(self.escalation(), 'escalationRequest',
+                                  'tests/fixtures/escalation_details_lookup.xml',
+                                  'UpdateGeneralEscalation', 'lookupResponseData')
+        finally:
+            core.GSX_SPOOL_SIZE = size
+
+        data = etree.fromstring(sent).find('.//fileData').text
+        self.assertEqual(base64.b64decode(data), self.data)
+
+
+class StructTestCase(TestCase):
+    def test_conversion(self):
+        line = repairs.RepairOrderLine(partNumber='661-5097', abused=True, returnType=1)
+        self.assertEqual(line.abused, 'Y')
+        self.assertEqual(line.returnType, '1')
+        self.assertEqual(line.comptiaCode, '')
+        self.assertIn('abused', repairs.RepairOrderLine.__slots__)
+        self.assertFalse(hasattr(line, '__dict__'))
+
+    def test_defaults(self):
+        customer = repairs.Customer()
+        self.assertEqual(customer.adressLine1, '')
+        self.assertEqual(customer.state, 'ZZ')
+        self.assertEqual(customer._data, {})
+        with self.assertRaises(AttributeError):
+            customer.companyName
+
+    def test_extras(self):
+        customer = repairs.Customer(firstName='Filipp', faxNumber='blaa')
+        self.assertEqual(customer.faxNumber, 'blaa')
+        self.assertEqual(customer._data, {'firstName': 'Filipp', 'faxNumber': 'blaa'})
+        customer.unset('faxNumber')
+        self.assertEqual(customer._data, {'firstName': 'Filipp'})
+        with self.assertRaises(KeyError):
+            customer.unset('faxNumber')
+        with self.assertRaises(KeyError):
+            repairs.Customer().unset('faxNumber')
+
+    def test_serialize(self):
+        rep = repairs.CarryInRepair(shipTo='6191')
+        rep.customerAddress = repairs.Customer(firstName='Filipp', city='Helsinki')
+        rep.orderLines = [repairs.RepairOrderLine(partNumber='661-5097',
+                                                  outOfWarrantyFlag=False)]
+        expected = etree.tostring(rep.to_xml('repairData'), encoding='UTF-8')
+        self.assertEqual(rep.to_bytes('repairData'), expected)
+        self.assertIn(b'<outOfWarrantyFlag>N</outOfWarrantyFlag>', expected)
+
+
+class RepairDeltaTestCase(SessionMixin, TestCase):
+    def setUp(self):
+        super(RepairDeltaTestCase, self).setUp()
+        self.sent = []
+
+    def send(self, method, data):
+        self.sent.append(etree.fromstring(data).find('.//repairData'))
+        return FakeResponse('tests/fixtures/update_carryin_repair.xml')
+
+    def test_set_status(self):
+        rep = repairs.CarryInRepair('G135773004')
+        rep.notes = 'Lots of text'
+        rep.orderLines = [repairs.RepairOrderLine(partNumber='661-5594')]
+
+        with mock.patch.object(GsxRequest, '_send', self.send):
+            rep.update({})
+            result = rep.set_status('RFPU')
+
+        self.assertEqual(result.confirmationNumber, 'G135773004')
+        self.assertEqual([e.tag for e in self.sent[0]],
+                         ['repairConfirmationNumber', 'notes', 'orderLines'])
+        self.assertEqual([(e.tag, e.text) for e in self.sent[1]],
+                         [('repairConfirmationNumber', 'G135773004'),
+                          ('statusCode', 'RFPU')])
+        self.assertEqual(rep.changed, [])
+        self.assertEqual(rep.notes, 'Lots of text')
+
+    def test_nested(self):
+        rep = repairs.CarryInRepair('G135773004')
+        rep.orderLines = [repairs.RepairOrderLine(partNumber='661-5594')]
+        rep.customerAddress = repairs.Customer(city='A')
+
+        with mock.patch.object(GsxRequest, '_send', self.send):
+            rep.update({})
+            rep.orderLines.append(repairs.RepairOrderLine(partNumber='661-5595'))
+            rep.customerAddress.city = 'B'
+            self.assertEqual(rep.changed, ['orderLines', 'customerAddress'])
+            rep.update({})
+
+        self.assertEqual([e.tag for e in self.sent[1]],
+                         ['repairConfirmationNumber', 'orderLines', 'orderLines',
+                          'customerAddress'])
+        self.assertEqual(self.sent[1].find('customerAddress/city').text, 'B')
+        self.assertEqual(rep.changed, [])
+
+
+class PreflightTestCase(SessionMixin, TestCase):
+    def setUp(self):
+        super(PreflightTestCase, self).setUp()
+        core.GSX_PREFLIGHT = True
+
+    def tearDown(self):
+        super(PreflightTestCase, self).tearDown()
+        core.GSX_PREFLIGHT = False
+
+    def test_errors(self):
+        order = orders.StockingOrder(shipToCode='677592').add_part('blaa', 1)
+        with self.assertRaises(core.GsxValidationError) as cm:
+            order.submit()
+        self.assertEqual(cm.exception.errors, {
+            'purchaseOrderNumber': 'Required field purchaseOrderNumber is missing',
+            'orderLines[0].partNumber': 'Invalid partNumber: blaa',
+        })
+
+    def test_alternatives(self):
+        with self.assertRaisesRegex(GsxError, 'serialNumber or alternateDeviceId'):
+            Product('').warranty()
+
+    def test_aliases(self):
+        rep = repairs.IndirectOnsiteRepair(serialNumber='DGKFL06JDHJP',
+                                           shipTo='6191', poNumber='123',
+                                           customerAddress=repairs.Customer())
+        result, sent = submit(rep, 'repairData', 'tests/fixtures/update_carryin_repair.xml',
+                              'CreateIndirectOnsiteRepair')
+        data = etree.fromstring(sent).find('.//repairData')
+        self.assertEqual(data.findtext('shippingLocation'), '6191')
+        self.assertEqual(data.findtext('purchaseOrderNumber'), '123')
+        self.assertIsNone(data.find('shipTo'))
+
+
+class LocaleFormatTestCase(TestCase):
+    def test_formats(self):
+        self.assertEqual(core.get_format('en_GB'), {'df': '%d/%m/%y', 'tf': '%H:%M'})
+        self.assertIs(core.get_format('en_GB'), core.get_format('en_GB'))
+
+    def test_object_dates(self):
+        obj = core.GsxObject(unitReceivedDate=date(2013, 3, 1))
+        self.assertEqual(obj.unitReceivedDate, '03/01/13')
+
+
+class CacheMaintenanceTestCase(TestCase):
+    def setUp(self):
+        class Cache(GsxCache):
+            tmpdir = tempfile.mkdtemp()
+        self.cache = Cache
+
+    def tearDown(self):
+        self.cache.nukeall()
+        os.rmdir(self.cache.tmpdir)
+
+    def backdate(self, fp, seconds):
+        old = time.time() - seconds
+        for f in self.cache.shelves()[fp]:
+            os.utime(f, (old, old))
+
+    def test_sweep_expired(self):
+        c = self.cache('expired', expires=timedelta(seconds=-1))
+        c.set('spam', 'eggs' * 1000)
+        c.shelf.close()
+        self.backdate(c.fp, 3600)
+        self.assertGreater(self.cache.sweep(), 0)
+        c = self.cache('expired')
+        self.assertIsNone(c.get('spam'))
+        c.shelf.close()
+
+    def test_sweep_in_use(self):
+        c = self.cache('busy', expires=timedelta(seconds=-1))
+        c.set('spam', 'eggs' * 1000)
+        c.shelf.close()
+        self.assertEqual(self.cache.sweep(), 0)
+        c = self.cache('busy')
+        self.assertIn('spam', c.shelf)
+        c.shelf.close()
+
+    def test_sweep_locked(self):
+        c = self.cache('locked')
+        c.shelf.close()
+        self.backdate(c.fp, 3600)
+        with mock.patch.object(core.shelve, 'open', side_effect=OSError('locked')):
+            self.assertEqual(self.cache.sweep(), 0)
+        self.assertIn(c.fp, self.cache.shelves())
+
+    def test_sweep_orphaned(self):
+        c = self.cache('orphan')
+        c.shelf.close()
+        self.backdate(c.fp, 3 * 24 * 3600)
+        self.assertGreater(self.cache.sweep(compact=False), 0)
+        self.assertNotIn(c.fp, self.cache.shelves())
+
+    def test_nukeall(self):
+        self.cache('spam').shelf.close()
+        self.assertGreater(self.cache.nukeall(), 0)
+        self.assertEqual(self.cache.shelves(), {})
+
+
+class SnapshotTestCase(TestCase):
+    def setUp(self):
+        self.path = tempfile.mktemp(suffix='.snap')
+        codes = {'E': [('E01', 'Any iPod issue')]}
+        snapshot.build(self.path, comptia=codes)
+        self.snap = snapshot.load(self.path)
+
+    def tearDown(self):
+        self.snap.close()
+        os.remove(self.path)
+
+    def test_locale(self):
+        self.assertEqual(self.snap.locale('en_XXX')['df'], '%m/%d/%y')
+
+    def test_models(self):
+        self.assertEqual(self.snap.family('APPLETV')['name'], 'Apple TV')
+        self.assertEqual(self.snap.model_family('Apple TV 4K'), 'APPLETV')
+
+    def test_comptia(self):
+        self.assertEqual(self.snap.comptia('E'), [('E01', 'Any iPod issue')])
+        self.assertIsNone(self.snap.get('comptia', 'X'))
+
+    def test_default(self):
+        missing = self.path + '.missing'
+        with mock.patch.multiple(snapshot, SNAPSHOT_PATH=missing, _snapshot=None):
+            with mock.patch.object(snapshot.os.path, 'exists',
+                                   wraps=os.path.exists) as exists:
+                self.assertIsNone(snapshot.load())
+                self.assertIsNone(snapshot.load())
+            self.assertEqual(exists.call_count, 1)
+
+            snapshot.build(missing)
+            try:
+                snap = snapshot.load()
+                self.assertEqual(snap.family('APPLETV')['name'], 'Apple TV')
+                self.assertIs(snapshot.load(), snap)
+                snap.close()
+            finally:
+                os.remove(missing)
+
+
+class ParserTestCase(TestCase):
+    def test_entry_points(self):
+        path = 'tests/fixtures/warranty_status.xml'
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        for result in (objectify.parse_file(path, 'warrantyDetailInfo'),
+                       objectify.parse_bytes(data, 'warrantyDetailInfo'),
+                       parse(data.decode('utf-8'), 'warrantyDetailInfo')):
+            self.assertEqual(result.warrantyStatus, 'Apple Limited Warranty')
+
+    def test_find(self):
+        # The inner response element and results outside the usual place
+        result = parse('tests/fixtures/parts_lookup.xml', 'PartsLookupResponse')
+        self.assertEqual(result.tag, 'PartsLookupResponse')
+        result = parse('tests/fixtures/multierror.xml', 'faultstring')
+        self.assertRegex(str(result), 'Multiple error messages exist')
+
+    def test_memo(self):
+        data = parse('tests/fixtures/warranty_status.xml', 'warrantyDetailInfo')
+        self.assertIs(data.estimatedPurchaseDate, data.estimatedPurchaseDate)
+        self.assertIn(('estimatedPurchaseDate', '08/25/10'), objectify._memo)
+        self.assertIsNone(objectify.value('packingList', ''))
+        self.assertNotIn(('packingList', ''), objectify._memo)
+
+    def test_thread_parsers(self):
+        import threading
+        parsers = []
+        t = threading.Thread(target=lambda: parsers.append(objectify.get_parser()))
+        t.start()
+        t.join()
+        self.assertIs(objectify.get_parser(), objectify.get_parser())
+        self.assertIsNot(parsers[0], objectify.get_parser())
+
+
+class ResponseAttachmentTestCase(TestCase):
+    def setUp(self):
+        self._spool = objectify.SPOOL_DIR
+        objectify.SPOOL_DIR = tempfile.mkdtemp()
+        self.data = b'%PDF-1.4 ' + os.urandom(1000)
+        self.xml = ('<Envelope><Body><ns:ReturnLabelResponse xmlns:ns="urn:x">'
+                    '<ReturnLabelResponse><returnLabelData>'
+                    '<returnLabelFileData>%s</returnLabelFileData>'
+                    '</returnLabelData></ReturnLabelResponse></ns:ReturnLabelResponse>'
+                    '</Body></Envelope>') % base64.b64encode(self.data).decode()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(objectify.SPOOL_DIR)
+        objectify.SPOOL_DIR = self._spool
+
+    def test_lazy(self):
+        label = parse(self.xml, 'returnLabelData').returnLabelFileData
+        self.assertEqual(os.listdir(objectify.SPOOL_DIR), [])
+        self.assertEqual(label.bytes, self.data)
+        self.assertEqual(label.mmap()[:], self.data)
+        with open(label, 'rb') as fp:
+            self.assertEqual(fp.read(), self.data)
+
+    def test_dedupe(self):
+        result = parse(self.xml, 'returnLabelData')
+        paths = set(str(result.returnLabelFileData) for i in range(3))
+        self.assertEqual(len(paths), 1)
+        self.assertEqual(len(os.listdir(objectify.SPOOL_DIR)), 1)
+
+    def test_cleanup(self):
+        path = parse(self.xml, 'returnLabelData').returnLabelFileData.path
+        self.assertEqual(objectify.cleanup(), 0)
+        old = time.time() - 2 * 86400
+        os.utime(path, (old, old))
+        self.assertEqual(objectify.cleanup(), len(self.data))
+        self.assertFalse(os.path.exists(path))
+
+        # Cleaned up since it was last written, written again
+        self.assertEqual(parse(self.xml, 'returnLabelData').returnLabelFileData.path, path)
+        with open(path, 'rb') as fp:
+            self.assertEqual(fp.read(), self.data)
+
+
+class ResponseSpoolTestCase(SessionMixin, TestCase):
+    def warranty(self, fixture, status_code=200, **kwargs):
+        req = GsxRequest(WarrantyStatusRequest=core.GsxObject(serialNumber='DGKFL06JDHJP'))
+        send = lambda req, method, data: FakeResponse(fixture, status_code)
+        with mock.patch.object(GsxRequest, '_send', send):
+            return req, req._submit('WarrantyStatus', **kwargs)
+
+    def test_spooled(self):
+        size, core.GSX_SPOOL_SIZE = core.GSX_SPOOL_SIZE, 256
+        try:
+            req, result = self.warranty('tests/fixtures/warranty_status.xml')
+        finally:
+            core.GSX_SPOOL_SIZE = size
+
+        self.assertEqual(result.warrantyStatus, 'Apple Limited Warranty')
+        self.assertEqual(req.xml_response, '')
+
+    def test_keep_response(self):
+        core.GSX_KEEP_RESPONSE = True
+        try:
+            req, result = self.warranty('tests/fixtures/warranty_status.xml')
+        finally:
+            core.GSX_KEEP_RESPONSE = False
+
+        with open('tests/fixtures/warranty_status.xml', 'rb') as fp:
+            self.assertEqual(req.xml_response, fp.read())
+
+    def test_parse_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+        pool, size = core.GSX_PARSE_POOL, core.GSX_POOL_SIZE
+        core.GSX_PARSE_POOL, core.GSX_POOL_SIZE = ProcessPoolExecutor(1), 1024
+        try:
+            req, tree = self.warranty('tests/fixtures/warranty_status.xml')
+            req, result = self.warranty('tests/fixtures/warranty_status.xml', materialize=True)
+        finally:
+            core.GSX_PARSE_POOL.shutdown()
+            core.GSX_PARSE_POOL, core.GSX_POOL_SIZE = pool, size
+
+        # Only materialized results come from the pool
+        self.assertIsInstance(tree, objectify.GsxElement)
+        self.assertIsInstance(result, objectify.GsxRecord)
+        self.assertEqual(result.warrantyStatus, 'Apple Limited Warranty')
+        self.assertEqual(result.estimatedPurchaseDate, date(2010, 8, 25))
+
+    def test_diagnostics_pool(self):
+        fixture = 'tests/fixtures/diagnostic_details.xml'
+        pool = mock.Mock()
+        pool.submit.return_value.result.return_value = 'records'
+        diags = diagnostics.Diagnostics(diagnosticEventNumber='12942008007242012052919')
+        send = lambda req, method, data: FakeResponse(fixture)
+
+        with mock.patch.multiple(core, GSX_PARSE_POOL=pool, GSX_POOL_SIZE=0):
+            with mock.patch.object(GsxRequest, '_send', send):
+                details = diags.fetch()
+                self.assertFalse(pool.submit.called)
+                self.assertEqual(diags.fetch(materialize=True), 'records')
+
+        with open(fixture, 'rb') as fp:
+            body = fp.read()
+        pool.submit.assert_called_once_with(objectify.parse_records, body,
+                                            'diagnosticDetailsResponseData')
+        self.assertEqual(details.eventHeader.serialNumber, 'DGKFL06JDHJP')
+
+    def test_error(self):
+        with self.assertRaisesRegex(GsxError, 'Multiple error messages exist') as cm:
+            self.warranty('tests/fixtures/multierror.xml', 400)
+        self.assertEqual(cm.exception.code, 'GSX.SYS.003')
+
+
+class RecordTestCase(SessionMixin, TestCase):
+    def test_warranty(self):
+        import pickle
+        product = Product('DGKFL06JDHJP')
+        send = lambda req, method, data: FakeResponse('tests/fixtures/warranty_status.xml')
+        with mock.patch.object(GsxRequest, '_send', send):
+            wty = product.warranty(materialize=True)
+
+        self.assertIsInstance(wty, objectify.GsxRecord)
+        self.assertEqual(wty.warrantyStatus, 'Apple Limited Warranty')
+        self.assertIsInstance(wty.estimatedPurchaseDate, date)
+        self.assertIs(wty.daysRemaining, 0)
+        self.assertIsNone(wty.blaa)
+        copy = pickle.loads(pickle.dumps(wty))
+        self.assertEqual(copy.as_dict(), wty.as_dict())
+        self.assertIs(copy._index, wty._index)
+
+    def test_repeated(self):
+        data = parse('tests/fixtures/parts_lookup.xml', 'PartsLookupResponse')
+        record = objectify.materialize(data)
+        self.assertEqual([p.partDescription for p in record.parts],
+                         [p.partDescription for p in data.parts])
+        self.assertIs(record.parts[0]._fields, record.parts[1]._fields)
+        self.assertIs(record.parts[0]._index, record.parts[1]._index)
+        self.assertTrue(record.parts[0].isSerialized)
+
+    def test_stream(self):
+        send = lambda req, method, data: FakeResponse('tests/fixtures/parts_lookup.xml')
+        with mock.patch.object(GsxRequest, '_send', send):
+            parts = lookups.Lookup(serialNumber='DGKFL06JDHJP').parts(stream=True)
+
+        self.assertNotIsInstance(parts, list)
+        data = parse('tests/fixtures/parts_lookup.xml', 'PartsLookupResponse')
+        self.assertEqual([p.as_dict() for p in parts],
+                         [p.as_dict() for p in objectify.materialize(data.parts)])
+
+    def test_single(self):
+        data = objectify.materialize(parse('tests/fixtures/repair_details_ca.xml',
+                                           'lookupResponseData'))
+        self.assertEqual(data.dispatchId, 'G2093174681')
+        self.assertEqual([r.tag for r in data], ['lookupResponseData'])
+
+
+class DateParserTestCase(TestCase):
+    def test_matches_strptime(self):
+        for y in (0, 14, 68, 69, 99):
+            for h in range(1, 13):
+                d = datetime(2000 + y if y < 69 else 1900 + y, 3, 6, h, 1, 2)
+                for p in ('AM', 'PM', 'pm'):
+                    ts = '03/06/%02d %02d:01 %s' % (y, h, p)
+                    self.assertEqual(objectify.gsx_timestamp(ts),
+                                     datetime.strptime(ts, '%m/%d/%y %I:%M %p'))
+                ts = '06-%s-%02d %02d:01:02' % (d.strftime('%b').upper(), y, h)
+                self.assertEqual(gsx_diags_timestamp(ts),
+                                 datetime.strptime(ts, '%d-%b-%y %I:%M:%S'))
+                ds = d.strftime('%m/%d/%y')
+                self.assertEqual(objectify.gsx_date(ds), d.date())
+
+    def test_fallbacks(self):
+        self.assertEqual(objectify.gsx_date('2014-03-06'), date(2014, 3, 6))
+        self.assertEqual(objectify.gsx_date('3/6/14'), date(2014, 3, 6))
+        self.assertIsNone(objectify.gsx_date('02/30/14'))
+        self.assertIsNone(objectify.gsx_date(None))
+        self.assertEqual(objectify.gsx_datetime('2011-01-27 11:45:01 PST'),
+                         datetime(2011, 1, 27, 11, 45, 1))
+        with self.assertRaises(ValueError):
+            objectify.gsx_timestamp('03/06/14 13:01 PM')
+        with self.assertRaises(ValueError):
+            gsx_diags_timestamp('06-XYZ-14 09:01:02')
+
+    def test_convert_column(self):
+        values = ['08/25/10', '', '08/25/10']
+        result = objectify.convert_column('estimatedPurchaseDate', values)
+        self.assertEqual(result, [date(2010, 8, 25), None, date(2010, 8, 25)])
+        self.assertIs(result[0], result[2])
+
+
+class JsonLinesTestCase(TestCase):
+    def test_stream(self):
+        from gsxws import export
+        fp = io.StringIO()
+        with open('tests/fixtures/parts_lookup.xml', 'rb') as xml:
+            count = export.write_jsonl(objectify.iterparse(xml, 'parts'), fp)
+
+        lines = [json.loads(l) for l in fp.getvalue().splitlines()]
+        self.assertEqual(count, 3)
+        self.assertEqual(lines[0]['partNumber'], '661-4448')
+        self.assertEqual(lines[0]['exchangePrice'], 14.4)
+        self.assertIs(lines[2]['isSerialized'], False)
+
+    def test_siblings(self):
+        from gsxws import export
+        data = parse('tests/fixtures/parts_lookup.xml', 'parts')
+        for results in (data, [data]):
+            fp = io.StringIO()
+            self.assertEqual(export.write_jsonl(results, fp), 3)
+            self.assertEqual([json.loads(l)['partNumber'] for l in fp.getvalue().splitlines()],
+                             ['661-4448', '661-4954', '661-5028'])
+
+    def test_types(self):
+        from gsxws import export
+        fp = io.StringIO()
+        data = parse('tests/fixtures/warranty_status.xml', 'warrantyDetailInfo')
+        request = core.GsxObject(serialNumber='DGKFL06JDHJP')
+        export.write_jsonl([data, [objectify.materialize(data), request]], fp)
+
+        first, second, third = [json.loads(l) for l in fp.getvalue().splitlines()]
+        self.assertEqual(first['estimatedPurchaseDate'], '2010-08-25')
+        self.assertEqual(first, second)
+        self.assertEqual(third, {'serialNumber': 'DGKFL06JDHJP'})
+
+
+@skipUnless(numpy, 'NumPy is not installed')
+class ExportTestCase(TestCase):
+    def setUp(self):
+        from gsxws import export
+        data = parse('tests/fixtures/warranty_status.xml', 'warrantyDetailInfo')
+        other = {'productDescription': 'iPad 2', 'coverageEndDate': date(2013, 1, 1),
+                 'limitedWarranty': False, 'daysRemaining': 3}
+        self.cols = export.columns([data, objectify.materialize(data), other])
+
+    def test_types(self):
+        cols = self.cols
+        self.assertEqual(cols['coverageEndDate'].dtype, numpy.dtype('datetime64[D]'))
+        self.assertEqual(cols['limitedWarranty'].tolist(), [True, True, False])
+        self.assertEqual(cols['configDescription'][2], None)
+        self.assertEqual(cols['productDescription'].categories.tolist(), ['iPhone 4', 'iPad 2'])
+        self.assertEqual(cols['daysRemaining'].tolist(), [0, 0, 3])
+
+    def test_vectorized(self):
+        ends = self.cols['coverageEndDate']
+        models = self.cols['productDescription']
+        self.assertEqual(ends[models == 'iPad 2'].max(), numpy.datetime64('2013-01-01'))
+        self.assertEqual((models != 'iPhone 4').sum(), 1)
+
+    @skipUnless(pyarrow, 'PyArrow is not installed')
+    def test_parquet(self):
+        from gsxws import export
+        import pyarrow.parquet
+        path = os.path.join(tempfile.mkdtemp(), 'warranty.parquet')
+        export.to_parquet(self.cols, path)
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.column('productDescription').to_pylist(),
+                         ['iPhone 4', 'iPhone 4', 'iPad 2'])
+        self.assertEqual(table.column('coverageEndDate').to_pylist()[2], date(2013, 1, 1))
+
+
+class ImportTestCase(TestCase):
+    def test_lazy(self):
+        import subprocess
+        code = ('import sys, gsxws; gsxws.validate("DGKFL06JDHJP"); gsxws.REPAIR_TYPES; '
+                'print(sorted(m for m in ("requests", "lxml", "gsxws.objectify") '
+                'if m in sys.modules))')
+        out = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(out.strip(), b'[]')
+
+    def test_names(self):
+        import gsxws
+        self.assertIs(gsxws.GsxError, core.GsxError)
+        self.assertIs(gsxws.Product, Product)
+        self.assertIs(gsxws.index, products.index)
+        self.assertIs(gsxws.ProductIndex, products.ProductIndex)
+        self.assertIs(gsxws.objectify, objectify)
+        self.assertTrue(callable(gsxws.content))
+        self.assertIn('CarryInRepair', dir(gsxws))
+        with self.assertRaises(AttributeError):
+            gsxws.blaa
+
+
 class TestTypes(TestCase):
     def setUp(self):
         with open('tests/fixtures/escalation_details_lookup.xml', 'rb') as xml:
@@ -205,6 +960,20 @@ class TestErrorFunctions(TestCase):
     def test_message(self):
         self.assertRegex(self.data.message, 'Multiple error messages exist.')
 
+    def test_parsed(self):
+        path = 'tests/fixtures/multierror.xml'
+        for xml in (etree.parse(path), etree.parse(path, objectify.get_parser()).getroot()):
+            e = GsxError(xml=xml)
+            self.assertEqual(e.codes, self.data.codes)
+            self.assertEqual(e.messages, self.data.messages)
+
+    def test_not_xml(self):
+        for body in (b'<!DOCTYPE html><html><p>Bad Gateway</p></html>',
+                     '<HTML>Service Unavailable</HTML>', b'', b'<broken'):
+            e = GsxError('Internal Server Error', xml=body)
+            self.assertEqual(e.messages, ['Internal Server Error'])
+            self.assertEqual(e.code, 'XXX')
+
     def test_exception(self):
         msg = 'Connection failed'
         e = GsxError(msg)
@@ -380,6 +1149,22 @@ class TestPartFunction(RemoteTestCase):
 class TestProductData(TestCase):
     def test_models(self):
         models = products.models()
+        self.assertEqual(models['APPLETV']['name'], 'Apple TV')
+        models['APPLETV']['models'].append('Blaa')
+        self.assertNotIn('Blaa', products.models()['APPLETV']['models'])
+
+    def test_index(self):
+        index = products.index()
+        self.assertIs(index, products.index())
+        self.assertEqual(index.family_of('Apple TV 4K'), 'APPLETV')
+        self.assertIsNone(index.family_of('apple tv 4k'))
+        self.assertEqual(index.startswith('APPLE TV ('), ['Apple TV (2nd generation)',
+                                                          'Apple TV (3rd generation)',
+                                                          'Apple TV (4th generation)'])
+        self.assertEqual(index.startswith('blaa'), [])
+        self.assertIn('iMac (Retina 5K, 27-inch, 2017)', index.search('retina 5k'))
+        self.assertEqual(index.models('APPLETV'), products.models()['APPLETV']['models'])
+        self.assertEqual(index.models('BLAA'), [])
 
     @skip
     def test_product_image(self):
@@ -566,7 +1351,7 @@ class TestOnsiteDispatchDetail(TestCase):
         self.assertEqual(self.data.dispatchId, 'G101260028')
 
     def test_address(self):
-        self.assertEqual(self.data.primaryAddress.zipCode, 85024)
+        self.assertEqual(self.data.primaryAddress.zipCode, '85024')
         self.assertEqual(self.data.primaryAddress.firstName, 'Christopher')
 
     def test_orderlines(self):